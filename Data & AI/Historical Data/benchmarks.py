@@ -0,0 +1,462 @@
+"""
+================================================================================
+BENCHMARK SUITE - DATA AND INFERENCE HOT PATHS
+================================================================================
+
+Times the hot paths of the historical data pipeline on fixed synthetic inputs
+sized like production and writes the results as JSON, so runs can be compared
+before deploy.
+
+Covered:
+- preprocessing_historical: convert_units_for_npk, apply_scientific_npk_correction,
+  write_columnar/load_columnar (after a round-trip check)
+- main_pipeline: TemporalSoilDataHandler cache lookups, CheckpointManager,
+  DatabaseManager.bulk_insert on the embedded SQLite backend
+- Forecasting notebook: prepare_time_series + forecast_future
+
+Usage:
+    python benchmarks.py                          # full suite
+    python benchmarks.py --rows 3500 --locations 20 --output quick.json
+
+Benchmarks whose dependencies are missing (Earth Engine client for
+main_pipeline, joblib/xgboost for the forecast models) are reported as
+skipped instead of failing the run.
+================================================================================
+"""
+
+import argparse
+import ast
+import json
+import logging
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import preprocessing_historical as preprocessing
+
+logger = logging.getLogger(__name__)
+
+ROW_SIZES = [3500, 100000, 1000000]
+LOCATION_COUNTS = [20, 2000]
+MONTHS = [(year, month) for year in range(2017, 2026) for month in range(1, 13)]
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / "Models"
+FORECAST_MODELS_DIR = (
+    Path(__file__).resolve().parent.parent / "Needed Files for Deploy" / "Desertification Risk Forecasting"
+)
+
+
+# ==================== SYNTHETIC INPUTS ====================
+
+def make_historical_frame(rows: int, locations: int = 20, seed: int = 42) -> pd.DataFrame:
+    """
+    Synthetic historical_data export (units as stored: SOC in %, CEC in mmol/kg)
+
+    Rows are whole location time series in (location, year, month) order.
+    The location count is raised when needed so every (location, year, month)
+    key stays unique, as the table's unique index requires.
+    """
+    rng = np.random.default_rng(seed)
+    locations = max(locations, -(-rows // len(MONTHS)))
+
+    location_idx = np.arange(rows) % locations
+    month_idx = (np.arange(rows) // locations) % len(MONTHS)
+    years = np.array([MONTHS[i][0] for i in month_idx])
+    months = np.array([MONTHS[i][1] for i in month_idx])
+
+    # Soil properties are static per location
+    def per_location(low, high):
+        return rng.uniform(low, high, locations)[location_idx]
+
+    df = pd.DataFrame({
+        'location_name': np.array([f"Location_{i:04d}" for i in range(locations)])[location_idx],
+        'latitude': per_location(22.0, 31.5),
+        'longitude': per_location(25.0, 35.0),
+        'year': years,
+        'month': months,
+        'sand': per_location(20.0, 90.0),
+        'silt': per_location(5.0, 50.0),
+        'clay': per_location(5.0, 55.0),
+        'soc': per_location(0.1, 4.0),
+        'ph': per_location(6.5, 8.8),
+        'bdod': per_location(1.2, 1.6),
+        'cec': per_location(20.0, 400.0),
+        'ndvi': rng.uniform(0.0, 0.6, rows),
+        't2m_c': rng.uniform(10.0, 35.0, rows),
+        'td2m_c': rng.uniform(0.0, 20.0, rows),
+        'rh_pct': rng.uniform(15.0, 80.0, rows),
+        'tp_m': rng.exponential(0.05, rows),
+        'ssrd_jm2': rng.uniform(3e9, 9e9, rows),
+        'lc_type1': rng.choice([10, 20, 30, 40, 50, 60, 80], locations)[location_idx],
+        'ndvi_source': 'MODIS/MOD13A2',
+        'climate_source': 'ERA5_LAND',
+        'lc_source': 'ESA/WorldCover',
+        'data_quality_score': 100.0,
+        'nitrogen': per_location(0.02, 0.3),
+        'phosphorus': per_location(5.0, 35.0),
+        'potassium': per_location(100.0, 400.0),
+        'soil_version_year': np.where(years < 2020, 2017, np.where(years < 2022, 2020, 2022)),
+        'soil_data_year': years,
+    })
+
+    # A few gaps, as in the real export
+    for col in ['ndvi', 'cec', 'ph']:
+        df.loc[rng.random(rows) < 0.01, col] = np.nan
+
+    return df
+
+
+def make_locations(count: int, seed: int = 7) -> List[Dict]:
+    """Synthetic pipeline locations"""
+    rng = np.random.default_rng(seed)
+    return [
+        {'name': f"Location_{i:04d}", 'lat': float(lat), 'lon': float(lon)}
+        for i, (lat, lon) in enumerate(zip(rng.uniform(22.0, 31.5, count), rng.uniform(25.0, 35.0, count)))
+    ]
+
+
+# ==================== TIMING ====================
+
+def time_call(
+    func: Callable,
+    repeat: int = 3,
+    setup: Optional[Callable] = None,
+    items: Optional[int] = None
+) -> Dict:
+    """
+    Time func() over several runs (setup() runs untimed before each)
+
+    Returns min/median/mean seconds and, if items is given, throughput
+    based on the median.
+    """
+    timings = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        func(state) if setup else func()
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        'repeat': repeat,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'mean_s': statistics.mean(timings),
+    }
+    if items:
+        result['items'] = items
+        result['items_per_s'] = items / result['median_s'] if result['median_s'] > 0 else None
+    return result
+
+
+def skipped(reason: str) -> Dict:
+    return {'status': 'skipped', 'reason': reason}
+
+
+# ==================== PREPROCESSING BENCHMARKS ====================
+
+def bench_convert_units(rows: int, repeat: int) -> Dict:
+    df = make_historical_frame(rows)
+    return time_call(lambda: preprocessing.convert_units_for_npk(df), repeat, items=rows)
+
+
+def bench_npk_correction(rows: int, repeat: int) -> Dict:
+    df = make_historical_frame(rows)
+    return time_call(lambda: preprocessing.apply_scientific_npk_correction(df), repeat, items=rows)
+
+
+def check_columnar_round_trip(df: pd.DataFrame, output_file: Path):
+    """
+    Write df with write_columnar, load it back and compare
+
+    Timestamps must survive exactly (down to the microsecond), keys and
+    strings unchanged, measurements to float32 precision.
+    """
+    preprocessing.write_columnar(df, str(output_file))
+    loaded = preprocessing.load_columnar(str(output_file))
+
+    if list(loaded.columns) != list(df.columns) or len(loaded) != len(df):
+        raise ValueError(f"{output_file.name}: shape changed in the round trip")
+    for col in df.columns:
+        expected, actual = df[col], loaded[col]
+        if col in preprocessing.FLOAT32_COLUMNS:
+            same = np.allclose(actual.to_numpy(dtype=float), expected.to_numpy(dtype=float), rtol=1e-6, equal_nan=True)
+        elif col in preprocessing.TIMESTAMP_COLUMNS:
+            same = actual.equals(pd.to_datetime(expected).astype(actual.dtype))
+        else:
+            same = (actual.astype(object).to_numpy() == expected.astype(object).to_numpy()).all()
+        if not same:
+            raise ValueError(f"{output_file.name}: column {col} changed in the round trip")
+
+
+def bench_columnar(rows: int, repeat: int, work_dir: Path) -> Dict:
+    """write_columnar / load_columnar for Parquet and Feather (round trip checked first)"""
+    try:
+        import pyarrow  # noqa: F401 - optional dependency of the columnar formats
+    except ImportError as e:
+        return skipped(f"pyarrow not installed: {e}")
+
+    df = make_historical_frame(rows)
+    # Row timestamps with sub-millisecond precision, as DATETIME2 returns them
+    stamps = pd.Timestamp("2025-01-01 12:00:00.123456") + pd.to_timedelta(np.arange(rows), unit='us')
+    df['created_at'] = stamps
+    df['updated_at'] = stamps
+
+    results = {}
+    for suffix in ('parquet', 'feather'):
+        output_file = Path(tempfile.mkdtemp(dir=work_dir)) / f"historical_data.{suffix}"
+        check_columnar_round_trip(df, output_file)
+        results[suffix] = {
+            'write': time_call(lambda: preprocessing.write_columnar(df, str(output_file)), repeat, items=rows),
+            'load': time_call(lambda: preprocessing.load_columnar(str(output_file)), repeat, items=rows),
+        }
+    return results
+
+
+# ==================== PIPELINE BENCHMARKS ====================
+
+def _import_pipeline():
+    """main_pipeline needs the Earth Engine client importable"""
+    try:
+        import main_pipeline
+        return main_pipeline, None
+    except ImportError as e:
+        return None, f"main_pipeline not importable: {e}"
+
+
+def bench_soil_cache(locations: int, repeat: int, work_dir: Path) -> Dict:
+    """
+    Soil lookups for every location-month, served from the cache
+
+    Release entries are pre-seeded so no Earth Engine call is made:
+    'cold' starts with an empty per-year cache (release memo path once per
+    location-year), 'warm' repeats the run with every lookup a cache hit.
+    """
+    pipeline, reason = _import_pipeline()
+    if pipeline is None:
+        return skipped(reason)
+
+    sites = make_locations(locations)
+    lookups = len(sites) * len(MONTHS)
+
+    def seeded_handler():
+        cache_dir = Path(tempfile.mkdtemp(dir=work_dir))
+        handler = pipeline.TemporalSoilDataHandler(cache_dir=cache_dir)
+        for site in sites:
+            for version_info in handler.soil_versions.values():
+                key = handler._create_release_key(site['lat'], site['lon'], version_info)
+                handler.release_cache.put(key, {
+                    'sand': 60.0, 'silt': 20.0, 'clay': 20.0, 'soc': 0.8, 'ph': 7.9,
+                    'bdod': 1.45, 'cec': 12.0, 'nitrogen': 0.07, '_scale_used': 1000
+                })
+        return handler
+
+    def lookup_all(handler):
+        for site in sites:
+            for year, month in MONTHS:
+                handler.get_soil_data_for_date(site['lat'], site['lon'], year, month)
+
+    warm_handler = seeded_handler()
+    lookup_all(warm_handler)
+
+    return {
+        'cold': time_call(lookup_all, repeat, setup=seeded_handler, items=lookups),
+        'warm': time_call(lambda: lookup_all(warm_handler), repeat, items=lookups),
+    }
+
+
+def bench_checkpoint(locations: int, repeat: int, work_dir: Path) -> Dict:
+    """mark_completed / is_completed / save_checkpoint / reload for a full backfill"""
+    pipeline, reason = _import_pipeline()
+    if pipeline is None:
+        return skipped(reason)
+
+    tasks = [(site['name'], year, month) for site in make_locations(locations) for year, month in MONTHS]
+
+    def fresh_manager():
+        return pipeline.CheckpointManager(str(Path(tempfile.mkdtemp(dir=work_dir)) / "checkpoint.json"))
+
+    def mark_all(manager):
+        for task in tasks:
+            manager.mark_completed(*task)
+
+    manager = fresh_manager()
+    mark_all(manager)
+    manager.save_checkpoint()
+
+    return {
+        'mark_completed': time_call(mark_all, repeat, setup=fresh_manager, items=len(tasks)),
+        'is_completed': time_call(lambda: [manager.is_completed(*task) for task in tasks], repeat, items=len(tasks)),
+        'save_checkpoint': time_call(manager.save_checkpoint, repeat, items=len(tasks)),
+        'reload': time_call(
+            lambda: pipeline.CheckpointManager(str(manager.checkpoint_file)), repeat, items=len(tasks)
+        ),
+    }
+
+
+def bench_bulk_insert(rows: int, repeat: int, work_dir: Path) -> Dict:
+    """DatabaseManager.bulk_insert into a fresh SQLite historical_data table"""
+    pipeline, reason = _import_pipeline()
+    if pipeline is None:
+        return skipped(reason)
+
+    df = make_historical_frame(rows)
+
+    def fresh_db():
+        db_path = Path(tempfile.mkdtemp(dir=work_dir)) / "historical_data.sqlite"
+        return pipeline.DatabaseManager(backend=pipeline.SQLiteBackend(db_path))
+
+    return time_call(lambda db: db.bulk_insert(df, 'historical_data'), repeat, setup=fresh_db, items=rows)
+
+
+# ==================== FORECASTING BENCHMARKS ====================
+
+def load_notebook_functions(notebook: Path, names: List[str]) -> Dict:
+    """
+    Load the named functions from a notebook, plus its literal constants
+
+    Each code cell is parsed with ast and only the requested top-level defs
+    are compiled; assignments of plain literals (feature lists, lags) are
+    evaluated with ast.literal_eval. Data loads, plots and model fits in the
+    same cells never run. Keeps the benchmark on the exact code used by the
+    notebook instead of a copy that can drift.
+    """
+    cells = json.loads(notebook.read_text(encoding='utf-8'))['cells']
+    namespace = {'np': np, 'pd': pd}
+    for cell in cells:
+        if cell.get('cell_type') != 'code':
+            continue
+        try:
+            tree = ast.parse(''.join(cell.get('source', [])))
+        except SyntaxError:
+            # IPython magics and shell escapes
+            continue
+
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and node.name in names:
+                module = ast.Module(body=[node], type_ignores=[])
+                exec(compile(module, notebook.name, 'exec'), namespace)
+            elif isinstance(node, ast.Assign) and all(isinstance(target, ast.Name) for target in node.targets):
+                try:
+                    value = ast.literal_eval(node.value)
+                except (ValueError, TypeError, SyntaxError):
+                    continue
+                for target in node.targets:
+                    namespace[target.id] = value
+
+    missing = [name for name in names if name not in namespace]
+    if missing:
+        raise LookupError(f"{notebook.name} does not define {', '.join(missing)}")
+    return namespace
+
+
+def bench_forecasting(rows: int, repeat: int) -> Dict:
+    """prepare_time_series on the dataset, forecast_future (5 years) per location"""
+    notebook = MODELS_DIR / "Desertification_Forecasting.ipynb"
+    namespace = load_notebook_functions(
+        notebook, ['DYNAMIC_FEATURES', 'prepare_time_series', 'forecast_future']
+    )
+
+    df = make_historical_frame(rows)
+    results = {
+        'prepare_time_series': time_call(lambda: namespace['prepare_time_series'](df.copy()), repeat, items=rows)
+    }
+
+    try:
+        import joblib
+        namespace['forecast_models'] = {
+            feature: joblib.load(FORECAST_MODELS_DIR / f"xgb_forecast_{feature}.pkl")
+            for feature in namespace['DYNAMIC_FEATURES']
+        }
+    except Exception as e:
+        results['forecast_future'] = skipped(f"forecast models not loadable: {e}")
+        return results
+
+    ts_df = namespace['prepare_time_series'](df.copy())
+    series = [group for _, group in ts_df.groupby('location_name')]
+    results['forecast_future'] = time_call(
+        lambda: [namespace['forecast_future'](group, years=5) for group in series],
+        repeat,
+        items=len(series) * 5 * 12
+    )
+    return results
+
+
+# ==================== RUNNER ====================
+
+def run_benchmarks(
+    row_sizes: List[int] = ROW_SIZES,
+    location_counts: List[int] = LOCATION_COUNTS,
+    repeat: int = 3
+) -> Dict:
+    """Run the whole suite and return the JSON-ready report"""
+    work_dir = Path(tempfile.mkdtemp(prefix="greeneye_bench_"))
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'repeat': repeat,
+        'benchmarks': {}
+    }
+
+    suites = []
+    for rows in row_sizes:
+        suites += [
+            (f"convert_units_for_npk[{rows}]", lambda rows=rows: bench_convert_units(rows, repeat)),
+            (f"apply_scientific_npk_correction[{rows}]", lambda rows=rows: bench_npk_correction(rows, repeat)),
+            (f"columnar[{rows}]", lambda rows=rows: bench_columnar(rows, repeat, work_dir)),
+            (f"bulk_insert_sqlite[{rows}]", lambda rows=rows: bench_bulk_insert(rows, repeat, work_dir)),
+            (f"forecasting[{rows}]", lambda rows=rows: bench_forecasting(rows, repeat)),
+        ]
+    for locations in location_counts:
+        suites += [
+            (f"soil_cache[{locations}]", lambda locations=locations: bench_soil_cache(locations, repeat, work_dir)),
+            (f"checkpoint[{locations}]", lambda locations=locations: bench_checkpoint(locations, repeat, work_dir)),
+        ]
+
+    try:
+        for name, bench in suites:
+            logger.info(f"⏱️  {name}...")
+            try:
+                report['benchmarks'][name] = bench()
+            except Exception as e:
+                report['benchmarks'][name] = {'status': 'error', 'error': repr(e)}
+                logger.error(f"   ❌ {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data and inference hot paths")
+    parser.add_argument('--rows', type=int, nargs='+', default=ROW_SIZES, help="Dataset sizes in rows")
+    parser.add_argument('--locations', type=int, nargs='+', default=LOCATION_COUNTS, help="Location counts")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument('--output', default="benchmark_results.json", help="JSON report path")
+    args = parser.parse_args()
+
+    # Per-row pipeline logging would dominate the timings; keep only the runner's progress
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    report = run_benchmarks(args.rows, args.locations, args.repeat)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    logger.info(f"📄 Benchmark report saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
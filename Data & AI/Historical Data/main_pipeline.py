@@ -1,18 +1,40 @@
 
+import os
 import sys
 import logging
+import logging.handlers
+import atexit
+import copy
+import queue
 from datetime import datetime
-from typing import Dict, List, Optional, Callable
+from typing import Dict, List, Optional, Callable, Set, Tuple
 import time
 import json
+import hashlib
+import random
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 
 # Third-party imports
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
+from sqlalchemy import (
+    create_engine, event, text, select, bindparam, func,
+    MetaData, Table, Column, Index, Integer, Float, String, DateTime
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import ee
 
+# Local imports
+import profiling
+
 
 # ==================== CONFIGURATION ====================
 
@@ -20,9 +42,12 @@ class Config:
     """Centralized configuration management"""
     
     # Database Configuration
+    DB_BACKEND = "mssql"  # 'mssql' (SQL Server) or 'sqlite' (embedded, local/CI)
+    SQLITE_PATH = Path("historical_data.sqlite")
     DB_SERVER = "DESKTOP-LA1DOLE"
     DB_NAME = "DesertificationDB"
     DB_DRIVER = "ODBC Driver 17 for SQL Server"
+    DB_CREATE_SCHEMA = False  # Create historical_data on connect for server backends (SQLite always does)
     
     # Google Earth Engine
     GEE_PROJECT_ID = "grad-project-470219"
@@ -89,16 +114,159 @@ class Config:
     # Logging
     LOG_DIR = Path("logs")
     LOG_LEVEL = logging.INFO
+    LOG_ASYNC = True  # File/console writes on a background QueueListener thread
+    
+    # Per-task log lines (🔄 location-month, ✅ quality, soil fetches, ...)
+    # 'all'     - every line
+    # 'sample'  - all lines of 1 in TASK_LOG_SAMPLE_EVERY tasks, plus periodic progress lines
+    # 'summary' - none, periodic progress lines only
+    # Warnings and errors are never dropped
+    TASK_LOG_MODE = 'all'
+    TASK_LOG_SAMPLE_EVERY = 100
+    PROGRESS_LOG_SECONDS = 30
+    
+    # Soil Cache
+    SOIL_CACHE_LRU_SIZE = 4096  # Entries kept in memory per cache namespace
+    SOIL_SCALES = [1000, 2000, 5000]  # SoilGrids sampling scales, in priority order
+    
+    # Static layers (land cover, ...) resolved once per location
+    STATIC_CACHE_FILE = Path("cache/static_layers.sqlite")
     
     # Batch Processing
-    BATCH_SIZE = 2  # Process 12 months at a time
+    BATCH_SIZE = 500  # Flush buffered rows at this count...
+    BATCH_FLUSH_SECONDS = 30  # ...or when the oldest buffered row is this old (also checked between tasks)
+    INSERT_CHUNK_ROWS = 10000  # Rows per executemany inside one bulk_insert
+    READ_CHUNK_ROWS = 50000  # Rows per DataFrame yielded by read_historical_data
+    
+    # Write Mode
+    # 'append' - skip months already in the database, plain INSERT
+    # 'upsert' - stage each batch and MERGE on (location_name, year, month)
+    WRITE_MODE = 'append'
+    UPSERT_KEY_COLUMNS = ('location_name', 'year', 'month')
     CHECKPOINT_FILE = "pipeline_checkpoint.json"
+    CHECKPOINT_COMPACT_EVERY = 1000  # Journal entries between snapshots
+    EXISTING_KEYS_REFRESH_SECONDS = 300  # Reload existing DB keys after this long
+    
+    # Extraction Mode
+    # 'per_task' - one location-month per remote evaluation
+    # 'batched'  - all locations of a month in one reduceRegions call
+    # 'series'   - all months of a location in one server-side map
+    EXTRACTION_MODE = 'per_task'
+    SERIES_CHUNK_MONTHS = 60  # Months per getInfo() in series mode
+    
+    # Concurrency
+    MAX_WORKERS = 4  # Global cap on concurrent tasks (1 = serial)
+    
+    # Earth Engine request rate (shared token bucket, AIMD)
+    EE_INITIAL_RATE = 2.0      # Requests per second at startup
+    EE_MIN_RATE = 0.2          # Floor after repeated throttling
+    EE_MAX_RATE = 20.0         # Ceiling while calls keep succeeding
+    EE_RATE_INCREASE = 0.1     # Additive increase per success (req/s)
+    EE_RATE_DECREASE = 0.5     # Multiplicative decrease on throttling
+    EE_BURST = 5               # Token bucket capacity
+    EE_MAX_RETRIES = 5
+    EE_BACKOFF_BASE = 2.0      # Seconds, doubled per attempt
+    EE_BACKOFF_MAX = 60.0
+    
+    # Earth Engine response recording
+    # 'live'   - every getInfo() goes to Earth Engine
+    # 'record' - live, and each response is stored under its expression hash
+    # 'replay' - answer from the store only (offline); unrecorded calls fail
+    EE_RESPONSE_MODE = 'live'
+    EE_RESPONSE_STORE = Path("cache/ee_responses.sqlite")
+    EE_REPLAY_LATENCY = 0.0         # Seconds added to each replayed call
+    EE_REPLAY_LATENCY_JITTER = 0.0  # ± fraction of EE_REPLAY_LATENCY
+    
+    # Run Metrics (per-stage counts, bytes and latency percentiles)
+    METRICS_ENABLED = True
+    METRICS_DIR = LOG_DIR                # metrics_<timestamp>.json is written here
+    METRICS_PROMETHEUS_FILE = None       # e.g. Path("metrics/historical_pipeline.prom")
+    METRICS_RESERVOIR_SIZE = 2048        # Latency samples kept per stage for percentiles
+    METRICS_COUNT_EE_BYTES = False       # JSON-encode live getInfo responses to count bytes (record/replay reuse the stored payload)
 
 
 # ==================== LOGGING SETUP ====================
 
+def task_log(*task_key) -> Dict:
+    """
+    extra= for a per-task line, so Config.TASK_LOG_MODE can sample or drop it
+    
+    task_key identifies the task (latitude, longitude, year, month); sampling
+    keeps or drops all lines of a task together.
+    """
+    return {'per_task': True, 'task_key': task_key}
+
+
+class TaskLogFilter(logging.Filter):
+    """
+    Sample or drop per-task INFO/DEBUG records according to Config.TASK_LOG_MODE
+    
+    In 'sample' mode a record is kept when its task_key hashes into 1 of
+    sample_every buckets; records without a key are sampled by count.
+    """
+    
+    def __init__(self, mode: str = 'all', sample_every: int = 100):
+        super().__init__()
+        if mode not in ('all', 'sample', 'summary'):
+            raise ValueError(f"Unknown task log mode: {mode}")
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.seen = 0
+        self.suppressed = 0
+        self._lock = threading.Lock()
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.mode == 'all' or record.levelno >= logging.WARNING or not getattr(record, 'per_task', False):
+            return True
+        
+        task_key = getattr(record, 'task_key', None)
+        with self._lock:
+            self.seen += 1
+            if self.mode != 'sample':
+                keep = False
+            elif task_key:
+                keep = zlib.crc32(repr(task_key).encode('utf-8')) % self.sample_every == 0
+            else:
+                keep = (self.seen - 1) % self.sample_every == 0
+            if not keep:
+                self.suppressed += 1
+        return keep
+
+
+# Filter that sees every per-task record (set by setup_logging, read for the run summary)
+TASK_LOG_FILTER: Optional[TaskLogFilter] = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread
+    
+    The stock prepare() renders every message in the logging thread; records
+    only cross threads here (never processes), so they are passed as-is and
+    workers pay for little more than creating the record. Mutable arguments
+    are rendered up front so later changes can't leak into the message.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.args and any(isinstance(arg, (dict, list, set)) for arg in (
+            record.args.values() if isinstance(record.args, dict) else record.args
+        )):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
 def setup_logging():
-    """Setup comprehensive logging system"""
+    """
+    Setup comprehensive logging system
+    
+    With Config.LOG_ASYNC the root logger only enqueues records; a
+    QueueListener thread formats them and does the file and console I/O,
+    so worker threads never block on disk or stdout.
+    """
+    global TASK_LOG_FILTER
+    
     Config.LOG_DIR.mkdir(exist_ok=True)
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -125,15 +293,795 @@ def setup_logging():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(console_formatter)
     
+    # Per-task line sampling, applied before anything is queued or written
+    TASK_LOG_FILTER = TaskLogFilter(Config.TASK_LOG_MODE, Config.TASK_LOG_SAMPLE_EVERY)
+    
     # Root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(Config.LOG_LEVEL)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    
+    if Config.LOG_ASYNC:
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        queue_handler.addFilter(TASK_LOG_FILTER)
+        root_logger.addHandler(queue_handler)
+        
+        listener = logging.handlers.QueueListener(
+            log_queue, file_handler, console_handler, respect_handler_level=True
+        )
+        listener.start()
+        # Drain the queue before the interpreter exits
+        atexit.register(listener.stop)
+    else:
+        # One filter per handler - a shared one would count every record twice.
+        # Keyed sampling gives both the same decision; the file handler's filter
+        # sees all levels, so it is the one reported in the summary.
+        file_handler.addFilter(TASK_LOG_FILTER)
+        console_handler.addFilter(TaskLogFilter(Config.TASK_LOG_MODE, Config.TASK_LOG_SAMPLE_EVERY))
+        for handler in (file_handler, console_handler):
+            root_logger.addHandler(handler)
     
     return logging.getLogger(__name__)
 
 
+# ==================== RUN METRICS ====================
+
+class StageStats:
+    """
+    Count, errors, bytes and latency distribution of one stage
+    
+    Latencies go into fixed Prometheus-style buckets plus a bounded reservoir
+    sample (Algorithm R) that the p50/p95/p99 are computed from.
+    """
+    
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+    
+    def __init__(self, reservoir_size: int = Config.METRICS_RESERVOIR_SIZE):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.buckets = [0] * (len(self.BUCKETS) + 1)  # Last slot is +Inf
+        self.samples = []
+        self.reservoir_size = reservoir_size
+    
+    def observe(self, seconds: float, nbytes: int, error: bool, rng: random.Random):
+        self.count += 1
+        self.errors += int(error)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes += nbytes
+        self.buckets[bisect_left(self.BUCKETS, seconds)] += 1
+        
+        if len(self.samples) < self.reservoir_size:
+            self.samples.append(seconds)
+        else:
+            slot = rng.randrange(self.count)
+            if slot < self.reservoir_size:
+                self.samples[slot] = seconds
+    
+    def as_dict(self) -> Dict:
+        p50, p95, p99 = np.percentile(self.samples, [50, 95, 99]) if self.samples else (None, None, None)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'total_seconds': round(self.total_seconds, 6),
+            'mean_seconds': round(self.total_seconds / self.count, 6) if self.count else None,
+            'p50_seconds': None if p50 is None else round(float(p50), 6),
+            'p95_seconds': None if p95 is None else round(float(p95), 6),
+            'p99_seconds': None if p99 is None else round(float(p99), 6),
+            'max_seconds': round(self.max_seconds, 6),
+        }
+
+
+class RunMetrics:
+    """
+    Thread-safe registry of per-stage (and per-location) timings and counters
+    
+    Stages are dotted names such as 'ee.soil', 'db.bulk_insert' or
+    'checkpoint.journal'. Worker threads tag their calls with the location
+    they are processing via location(); the run report breaks every stage
+    down per location as well.
+    """
+    
+    PROMETHEUS_PREFIX = "historical_pipeline"
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._rng = random.Random(0)
+        self.reset()
+    
+    @property
+    def enabled(self) -> bool:
+        return Config.METRICS_ENABLED
+    
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.by_location = {}
+            self.counters = {}
+            self.gauges = {}
+            self.started_at = datetime.now()
+    
+    @contextmanager
+    def location(self, name: Optional[str]):
+        """Attribute calls made by this thread inside the block to a location"""
+        previous = getattr(self._local, 'location', None)
+        self._local.location = name
+        try:
+            yield
+        finally:
+            self._local.location = previous
+    
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Time a block as one call of stage
+        
+        Yields a dict; set sample['bytes'] inside the block to record payload size.
+        An exception leaving the block is recorded as an error and re-raised.
+        """
+        sample = {'bytes': 0}
+        start = time.perf_counter()
+        try:
+            yield sample
+        except BaseException:
+            self.observe(stage, time.perf_counter() - start, sample['bytes'], error=True)
+            raise
+        self.observe(stage, time.perf_counter() - start, sample['bytes'])
+    
+    def iterate(self, stage: str, iterable):
+        """Yield from iterable, timing each item fetch (DataFrame/Arrow sizes counted as bytes)"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                # The exhausting call is not a fetch - don't record it
+                return
+            except BaseException:
+                self.observe(stage, time.perf_counter() - start, error=True)
+                raise
+            self.observe(stage, time.perf_counter() - start, _payload_bytes(item))
+            yield item
+    
+    def observe(self, stage: str, seconds: float, nbytes: int = 0, error: bool = False):
+        """Record one call of stage"""
+        if not self.enabled:
+            return
+        location = getattr(self._local, 'location', None)
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.observe(seconds, nbytes, error, self._rng)
+            
+            if location is not None:
+                per_location = self.by_location.setdefault(location, {})
+                stats = per_location.get(stage)
+                if stats is None:
+                    stats = per_location[stage] = StageStats()
+                stats.observe(seconds, nbytes, error, self._rng)
+    
+    def count(self, event: str, amount: int = 1):
+        """Increment an event counter (throttles, retries, cache hits, ...)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+    
+    def gauge(self, name: str, value: float):
+        """Set a point-in-time value (current EE request rate, ...)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+    
+    def report(self, run_info: Optional[Dict] = None) -> Dict:
+        """Snapshot of everything recorded so far as a JSON-serializable dict"""
+        with self._lock:
+            return {
+                'run': {
+                    'started_at': self.started_at.isoformat(),
+                    'reported_at': datetime.now().isoformat(),
+                    **(run_info or {})
+                },
+                'stages': {stage: stats.as_dict() for stage, stats in sorted(self.stages.items())},
+                'locations': {
+                    location: {stage: stats.as_dict() for stage, stats in sorted(stages.items())}
+                    for location, stages in sorted(self.by_location.items())
+                },
+                'counters': dict(sorted(self.counters.items())),
+                'gauges': dict(sorted(self.gauges.items())),
+            }
+    
+    def write_json(self, output_file: Path, run_info: Optional[Dict] = None) -> Path:
+        """Write the run report"""
+        output_file = Path(output_file)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.report(run_info), f, indent=2, default=str)
+        return output_file
+    
+    def write_prometheus(self, output_file: Path) -> Path:
+        """
+        Write the stage metrics in Prometheus text exposition format
+        
+        Per-stage only (no location label) to keep series cardinality bounded.
+        The file is replaced atomically, as node_exporter's textfile collector expects.
+        """
+        prefix = self.PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {prefix}_stage_seconds Latency of pipeline stage calls",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted(self.stages.items())
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+        
+        for stage, stats in stages:
+            cumulative = 0
+            for bound, bucket_count in zip(StageStats.BUCKETS + (float('inf'),), stats.buckets):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {stats.total_seconds}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {stats.count}')
+        
+        lines += [f"# HELP {prefix}_stage_errors_total Failed pipeline stage calls",
+                  f"# TYPE {prefix}_stage_errors_total counter"]
+        lines += [f'{prefix}_stage_errors_total{{stage="{stage}"}} {stats.errors}' for stage, stats in stages]
+        
+        lines += [f"# HELP {prefix}_stage_bytes_total Payload bytes moved by pipeline stages",
+                  f"# TYPE {prefix}_stage_bytes_total counter"]
+        lines += [f'{prefix}_stage_bytes_total{{stage="{stage}"}} {stats.bytes}' for stage, stats in stages]
+        
+        lines += [f"# HELP {prefix}_events_total Pipeline events (throttles, retries, cache hits, ...)",
+                  f"# TYPE {prefix}_events_total counter"]
+        lines += [f'{prefix}_events_total{{event="{event}"}} {value}' for event, value in counters]
+        
+        for name, value in gauges:
+            metric = f"{prefix}_{name.replace('.', '_')}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        
+        output_file = Path(output_file)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = output_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_file, output_file)
+        return output_file
+
+
+def _payload_bytes(obj) -> int:
+    """Approximate in-memory size of a DataFrame / Arrow batch, 0 for anything else"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=False).sum())
+    return int(getattr(obj, 'nbytes', 0) or 0)
+
+
+# Process-wide registry, like the logging module's root logger
+METRICS = RunMetrics()
+
+
+# ==================== EARTH ENGINE CLIENT ====================
+
+class AdaptiveRateLimiter:
+    """
+    Thread-safe token bucket whose rate adapts with AIMD:
+    additive increase after each success, multiplicative decrease on throttling
+    """
+    
+    def __init__(
+        self,
+        initial_rate: float = Config.EE_INITIAL_RATE,
+        min_rate: float = Config.EE_MIN_RATE,
+        max_rate: float = Config.EE_MAX_RATE,
+        burst: int = Config.EE_BURST
+    ):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                
+                wait_time = (1.0 - self._tokens) / self.rate
+            time.sleep(wait_time)
+    
+    def on_success(self):
+        """Additive increase"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + Config.EE_RATE_INCREASE)
+    
+    def on_throttle(self):
+        """Multiplicative decrease and drain the bucket"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * Config.EE_RATE_DECREASE)
+            self._tokens = 0.0
+
+
+class EEResponseStore:
+    """
+    Content-addressed store of Earth Engine responses, backed by SQLite
+    
+    Keys are the SHA-256 of the serialized ee expression, so an identical
+    computation maps to the same entry in every run regardless of where it
+    was built.
+    """
+    
+    def __init__(self, db_path: Path = Config.EE_RESPONSE_STORE):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ee_responses (
+                    expression_key TEXT PRIMARY KEY,
+                    operation TEXT,
+                    response TEXT NOT NULL,
+                    recorded_at TEXT NOT NULL
+                )
+            """)
+    
+    @staticmethod
+    def key_for(computed) -> str:
+        """Content address of an ee expression"""
+        return hashlib.sha256(computed.serialize().encode('utf-8')).hexdigest()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ee_responses").fetchone()[0]
+    
+    def get_payload(self, key: str) -> Optional[str]:
+        """Recorded response as stored (JSON text), None if not recorded"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM ee_responses WHERE expression_key = ?", (key,)
+            ).fetchone()
+        return None if row is None else row[0]
+    
+    def get(self, key: str) -> Tuple[bool, any]:
+        """Return (found, response); a recorded response may itself be None"""
+        payload = self.get_payload(key)
+        if payload is None:
+            return False, None
+        return True, json.loads(payload)
+    
+    def put(self, key: str, operation_name: str, response: any) -> int:
+        """Record a response (replaces an older recording of the same expression); returns its size in bytes"""
+        try:
+            with METRICS.timer('cache.ee_responses.write') as sample, self._lock, self._conn:
+                payload = json.dumps(response)
+                sample['bytes'] = len(payload)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ee_responses (expression_key, operation, response, recorded_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, operation_name, payload, datetime.now().isoformat())
+                )
+            return len(payload)
+        except Exception as e:
+            self.logger.error(f"❌ Failed to record Earth Engine response for {operation_name}: {e}")
+            return 0
+
+
+class EarthEngineClient:
+    """
+    Single gateway for Earth Engine getInfo() calls: shared rate limit and retries
+    
+    With Config.EE_RESPONSE_MODE = 'record' every response is also written to an
+    EEResponseStore; 'replay' serves them back offline, with optional synthetic
+    latency, without touching the network or the rate limiter.
+    """
+    
+    # Quota / rate-limit errors - back off and slow down (matched lowercase)
+    THROTTLE_ERRORS = (
+        "429",
+        "too many requests",
+        "quota",
+        "too many concurrent aggregations",
+        "resource_exhausted",
+    )
+    
+    # Transient network errors - back off at the same rate
+    NETWORK_ERRORS = (
+        "connection aborted",
+        "remote end closed",
+        "connection reset",
+        "timed out",
+        "503",
+    )
+    
+    # Store key for the algorithm catalogue ee.Initialize() downloads
+    ALGORITHMS_KEY = "ee:algorithms"
+    
+    def __init__(
+        self,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        mode: Optional[str] = None,
+        store: Optional[EEResponseStore] = None
+    ):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.mode = mode or Config.EE_RESPONSE_MODE
+        if self.mode not in ('live', 'record', 'replay'):
+            raise ValueError(f"Unknown Earth Engine response mode: {self.mode}")
+        if store is None and self.mode != 'live':
+            store = EEResponseStore()
+        self.store = store
+    
+    def initialize(self, project: str):
+        """
+        Initialize Earth Engine
+        
+        In replay mode the recorded algorithm catalogue is used instead of the
+        one ee.Initialize() would download, so no credentials or network are needed.
+        """
+        if self.mode == 'replay':
+            found, algorithms = self.store.get(self.ALGORITHMS_KEY)
+            if not found:
+                raise LookupError(
+                    f"No recorded Earth Engine session in {self.store.db_path} - "
+                    f"run once with EE_RESPONSE_MODE = 'record'"
+                )
+            with self._recorded_algorithms(algorithms):
+                ee.Initialize(credentials=None, project=project)
+            self.logger.info(f"📼 Replaying Earth Engine responses from {self.store.db_path} ({len(self.store)} recorded)")
+            return
+        
+        ee.Initialize(project=project)
+        
+        if self.mode == 'record':
+            self.store.put(self.ALGORITHMS_KEY, 'algorithms', ee.data.getAlgorithms())
+            self.logger.info(f"📼 Recording Earth Engine responses to {self.store.db_path}")
+    
+    @staticmethod
+    @contextmanager
+    def _recorded_algorithms(algorithms: Dict):
+        """
+        Serve the recorded catalogue from ee.data.getAlgorithms while initializing
+        
+        Relies on ee internals: ee.Initialize() fetches the catalogue through
+        ee.data.getAlgorithms() once (ApiFunction.initialize) and caches it, so
+        the original function is restored as soon as initialization returns.
+        """
+        original = ee.data.getAlgorithms
+        ee.data.getAlgorithms = lambda: algorithms
+        try:
+            yield
+        finally:
+            ee.data.getAlgorithms = original
+    
+    def get_info(self, computed, operation_name: str, stage: str = 'ee.other') -> any:
+        """
+        Evaluate an ee object through the limiter (or the response store)
+        
+        The call, including limiter waits and retries, is timed under stage.
+        Response bytes come from the stored payload in record/replay mode; live
+        responses are only serialized for counting with Config.METRICS_COUNT_EE_BYTES.
+        """
+        with METRICS.timer(stage) as sample:
+            response, nbytes = self._evaluate(computed, operation_name)
+            if nbytes is None and METRICS.enabled and Config.METRICS_COUNT_EE_BYTES:
+                nbytes = len(json.dumps(response, default=str))
+            sample['bytes'] = nbytes or 0
+            return response
+    
+    def _evaluate(self, computed, operation_name: str) -> Tuple[any, Optional[int]]:
+        """Return (response, payload size in bytes or None if not serialized)"""
+        if self.mode == 'live':
+            return self.fetch_with_retry(computed.getInfo, operation_name), None
+        
+        key = self.store.key_for(computed)
+        
+        if self.mode == 'replay':
+            payload = self.store.get_payload(key)
+            if payload is None:
+                raise LookupError(f"No recorded Earth Engine response for {operation_name} ({key[:12]})")
+            if Config.EE_REPLAY_LATENCY > 0:
+                jitter = Config.EE_REPLAY_LATENCY_JITTER
+                time.sleep(Config.EE_REPLAY_LATENCY * random.uniform(1 - jitter, 1 + jitter))
+            return json.loads(payload), len(payload)
+        
+        response = self.fetch_with_retry(computed.getInfo, operation_name)
+        return response, self.store.put(key, operation_name, response)
+    
+    def fetch_with_retry(
+        self,
+        operation: Callable,
+        operation_name: str,
+        max_retries: int = Config.EE_MAX_RETRIES
+    ) -> any:
+        """Run an Earth Engine operation with rate limiting and jittered exponential backoff"""
+        for attempt in range(max_retries):
+            with METRICS.timer('ee.limiter_wait'):
+                self.limiter.acquire()
+            try:
+                result = operation()
+                self.limiter.on_success()
+                METRICS.gauge('ee.rate_requests_per_second', self.limiter.rate)
+                return result
+            except Exception as e:
+                message = str(e).lower()
+                throttled = any(marker in message for marker in self.THROTTLE_ERRORS)
+                transient = throttled or any(marker in message for marker in self.NETWORK_ERRORS)
+                
+                # For other errors or final retry failure, re-raise
+                if not transient or attempt == max_retries - 1:
+                    raise
+                
+                if throttled:
+                    self.limiter.on_throttle()
+                    METRICS.count('ee.throttled')
+                    METRICS.gauge('ee.rate_requests_per_second', self.limiter.rate)
+                    reason = f"Throttled, rate now {self.limiter.rate:.2f} req/s"
+                else:
+                    METRICS.count('ee.network_errors')
+                    reason = "Network error"
+                METRICS.count('ee.retries')
+                
+                wait_time = min(Config.EE_BACKOFF_MAX, Config.EE_BACKOFF_BASE * (2 ** attempt))
+                wait_time *= random.uniform(0.5, 1.5)  # Jitter
+                
+                self.logger.warning(
+                    f"⚠️ {operation_name} - {reason} (attempt {attempt + 1}/{max_retries}): {e}"
+                )
+                self.logger.info(f"🔄 Retrying in {wait_time:.1f} seconds...")
+                time.sleep(wait_time)
+        return None
+
+
+# ==================== SOIL CACHE STORE ====================
+
+class SoilCacheStore:
+    """
+    Crash-safe key-value store for soil data, backed by SQLite (WAL mode)
+    
+    Each put() is a single-row transaction, so writes are O(1) and a crash
+    cannot corrupt existing entries. WAL lets several worker processes read
+    while one writes. A bounded LRU sits in front of the database.
+    """
+    
+    def __init__(self, db_path: Path, namespace: str, lru_size: int = Config.SOIL_CACHE_LRU_SIZE):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.db_path = Path(db_path)
+        self.namespace = namespace
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.RLock()
+        
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS soil_cache (
+                    namespace TEXT NOT NULL,
+                    cache_key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (namespace, cache_key)
+                )
+            """)
+    
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM soil_cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        return row[0]
+    
+    def _remember(self, key: str, value: Dict):
+        """Put a value in the LRU, evicting the least recently used entry"""
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Get a cached value (LRU first, then SQLite)"""
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                METRICS.count(f'cache.{self.namespace}.hit')
+                return self._lru[key]
+            
+            row = self._conn.execute(
+                "SELECT value FROM soil_cache WHERE namespace = ? AND cache_key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                METRICS.count(f'cache.{self.namespace}.miss')
+                return None
+            
+            METRICS.count(f'cache.{self.namespace}.hit')
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return value
+    
+    def put(self, key: str, value: Dict, persist: bool = True):
+        """Store a value; persist=False keeps it in memory only"""
+        with self._lock:
+            self._remember(key, value)
+            if not persist:
+                return
+            try:
+                with METRICS.timer(f'cache.{self.namespace}.write') as sample, self._conn:
+                    payload = json.dumps(value)
+                    sample['bytes'] = len(payload)
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO soil_cache (namespace, cache_key, value, updated_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (self.namespace, key, payload, datetime.now().isoformat())
+                    )
+            except Exception as e:
+                self.logger.error(f"❌ Failed to save soil cache entry {key}: {e}")
+    
+    def import_json(self, json_file: Path) -> int:
+        """
+        One-time import of a legacy JSON cache file
+        
+        The file is renamed to *.json.imported afterwards, so clearing the
+        store later doesn't bring the stale entries back on the next start.
+        """
+        if not json_file.exists() or len(self) > 0:
+            return 0
+        try:
+            with open(json_file, 'r') as f:
+                legacy = json.load(f)
+            now = datetime.now().isoformat()
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO soil_cache (namespace, cache_key, value, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(self.namespace, key, json.dumps(value), now) for key, value in legacy.items()]
+                )
+            os.replace(json_file, json_file.with_name(json_file.name + '.imported'))
+            return len(legacy)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Failed to import legacy cache {json_file}: {e}")
+            return 0
+    
+    def clear(self):
+        """Remove all entries in this namespace"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM soil_cache WHERE namespace = ?", (self.namespace,))
+            self._lru.clear()
+
+
+# ==================== STATIC LAYER CACHE ====================
+
+class StaticLayerCache:
+    """
+    Values of time-invariant layers (land cover, elevation, slope, ...) per location
+    
+    Each registered layer is reduced at most once per location; the value is
+    kept in memory and persisted in a SoilCacheStore, so later months and later
+    runs reuse it without a remote call.
+    """
+    
+    def __init__(self, ee_client: EarthEngineClient, cache_file: Path = Config.STATIC_CACHE_FILE):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.ee_client = ee_client
+        Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+        self.store = SoilCacheStore(cache_file, 'static_layers')
+        self.layers = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+    
+    def register(
+        self,
+        name: str,
+        image: ee.Image,
+        band: str,
+        reducer: Callable,
+        scale: int = Config.SCALE_METERS
+    ):
+        """Register a static layer: image band reduced with reducer() (e.g. ee.Reducer.mode) at scale"""
+        self.layers[name] = {'image': image, 'band': band, 'reducer': reducer, 'scale': scale}
+    
+    @staticmethod
+    def _key(name: str, latitude: float, longitude: float) -> str:
+        return f"{name}_{latitude:.4f}_{longitude:.4f}"
+    
+    def _remember(self, key: str, value):
+        # Misses are kept in memory for this run only, not persisted
+        self.store.put(key, {'value': value}, persist=value is not None)
+    
+    def get(self, name: str, latitude: float, longitude: float):
+        """Layer value at a point, fetched on first use"""
+        key = self._key(name, latitude, longitude)
+        
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        
+        # One fetch per key even when several workers ask for it at once
+        with key_lock:
+            cached = self.store.get(key)
+            if cached is not None:
+                return cached['value']
+            
+            layer = self.layers[name]
+            values = self.ee_client.get_info(
+                layer['image'].reduceRegion(
+                    reducer=layer['reducer'](),
+                    geometry=ee.Geometry.Point([longitude, latitude]),
+                    scale=layer['scale'],
+                    bestEffort=True,
+                    maxPixels=1e9
+                ),
+                f"Static {name}",
+                stage=f'ee.{name}'
+            )
+            value = (values or {}).get(layer['band'])
+            self._remember(key, value)
+            return value
+    
+    def get_many(self, name: str, locations: List[Dict]) -> Dict[str, any]:
+        """
+        Layer values for many locations ({location name: value})
+        
+        Uncached locations are resolved together with one reduceRegions call.
+        """
+        layer = self.layers[name]
+        values = {}
+        missing = []
+        for location in locations:
+            cached = self.store.get(self._key(name, location['lat'], location['lon']))
+            if cached is not None:
+                values[location['name']] = cached['value']
+            else:
+                missing.append(location)
+        
+        if missing:
+            points = ee.FeatureCollection([
+                ee.Feature(ee.Geometry.Point([loc['lon'], loc['lat']]), {'name': loc['name']})
+                for loc in missing
+            ])
+            table = self.ee_client.get_info(
+                layer['image'].reduceRegions(
+                    collection=points,
+                    reducer=layer['reducer']().setOutputs([layer['band']]),
+                    scale=layer['scale']
+                ),
+                f"Static {name} ({len(missing)} locations)",
+                stage=f'ee.{name}'
+            )
+            fetched = {
+                feature['properties']['name']: feature['properties'].get(layer['band'])
+                for feature in table['features']
+            }
+            for location in missing:
+                value = fetched.get(location['name'])
+                self._remember(self._key(name, location['lat'], location['lon']), value)
+                values[location['name']] = value
+        
+        return values
+
+
 # ==================== TEMPORAL SOIL DATA HANDLER ====================
 
 class TemporalSoilDataHandler:
@@ -142,14 +1090,26 @@ class TemporalSoilDataHandler:
     Uses SoilGrids versions that were ACTUALLY AVAILABLE at each point in time
     """
     
-    def __init__(self, cache_dir: Optional[Path] = None):
+    # Whole-file JSON caches of older versions: (location-year, location-release)
+    LEGACY_CACHE_FILES = ("temporal_soil_cache.json", "soilgrids_release_cache.json")
+    
+    def __init__(self, cache_dir: Optional[Path] = None, ee_client: Optional[EarthEngineClient] = None):
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.ee_client = ee_client or EarthEngineClient()
         
         # Setup cache
         self.cache_dir = cache_dir or Path("cache/temporal_soil_data")
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.cache_file = self.cache_dir / "temporal_soil_cache.json"
-        self.soil_cache = self._load_cache()
+        self.cache_file = self.cache_dir / "temporal_soil_cache.sqlite"
+        self._cache_lock = threading.RLock()
+        self.soil_cache = SoilCacheStore(self.cache_file, 'location_year')
+        
+        # Release-level memo: SoilGrids layers are static, so each location
+        # needs one fetch per distinct release asset, not one per month
+        self.release_cache = SoilCacheStore(self.cache_file, 'release')
+        self._release_locks = {}
+        
+        self._import_legacy_caches()
         
         # Alexandria-specific alternative coordinates
         self.alexandria_alternatives = [
@@ -193,47 +1153,81 @@ class TemporalSoilDataHandler:
     def clear_cache(self):
         """Clear soil data cache to force fresh data"""
         try:
-            if self.cache_file.exists():
-                self.cache_file.unlink()
-                self.logger.info("🗑️ Temporal soil cache file deleted")
-            
-            if self.cache_dir.exists():
-                import shutil
-                shutil.rmtree(self.cache_dir)
-                self.logger.info("🗑️ Temporal soil cache directory deleted")
-            
-            # Recreate empty cache
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
-            self.soil_cache = {}
+            self.soil_cache.clear()
+            self.release_cache.clear()
+            
+            # Legacy JSON caches (and their imported backups) would otherwise be re-imported
+            for legacy_file in self.LEGACY_CACHE_FILES:
+                for path in (self.cache_dir / legacy_file, self.cache_dir / f"{legacy_file}.imported"):
+                    if path.exists():
+                        path.unlink()
+                        self.logger.info(f"🗑️ Deleted legacy soil cache {path.name}")
             self.logger.info("🔄 Temporal soil cache cleared completely")
             
         except Exception as e:
             self.logger.error(f"❌ Failed to clear temporal cache: {e}")
 
-    def _load_cache(self) -> Dict:
-        """Load soil data cache from file"""
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, 'r') as f:
-                    cache = json.load(f)
-                self.logger.info(f"📦 Loaded temporal soil cache: {len(cache)} location-years")
-                return cache
-            except Exception as e:
-                self.logger.warning(f"⚠️ Failed to load temporal cache: {e}")
-        return {}
-    
-    def _save_cache(self):
-        """Save soil data cache to file"""
-        try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.soil_cache, f, indent=2)
-        except Exception as e:
-            self.logger.error(f"❌ Failed to save temporal cache: {e}")
+    def _import_legacy_caches(self):
+        """Import the old whole-file JSON caches into the SQLite store once"""
+        legacy_soil, legacy_release = self.LEGACY_CACHE_FILES
+        imported = self.soil_cache.import_json(self.cache_dir / legacy_soil)
+        imported += self.release_cache.import_json(self.cache_dir / legacy_release)
+        if imported:
+            self.logger.info(f"📦 Imported {imported} entries from legacy JSON soil cache")
+        
+        self.logger.info(
+            f"📦 Soil cache: {len(self.soil_cache)} location-years, "
+            f"{len(self.release_cache)} location-releases"
+        )
     
     def _create_cache_key(self, latitude: float, longitude: float, year: int) -> str:
         """Create a unique cache key for a location and year"""
         return f"{latitude:.3f}_{longitude:.3f}_{year}"
     
+    def _create_release_key(self, latitude: float, longitude: float, version_info: Dict) -> str:
+        """
+        Cache key for a location and the SoilGrids asset actually read
+        
+        Keyed on collection + band suffix rather than version_year, so release
+        entries that point at the same assets share one fetch.
+        """
+        return f"{latitude:.3f}_{longitude:.3f}_{version_info['collection']}{version_info['suffix']}"
+    
+    def _get_release_soil_values(
+        self,
+        latitude: float,
+        longitude: float,
+        year: int,
+        force_refresh: bool = False
+    ) -> Dict:
+        """Get converted soil values for the year's release, fetching at most once per location-release"""
+        version_info = self._get_soil_version_for_year(year)
+        release_key = self._create_release_key(latitude, longitude, version_info)
+        
+        with self._cache_lock:
+            key_lock = self._release_locks.setdefault(release_key, threading.Lock())
+        
+        # One fetch per key even when several workers ask for it at once
+        with key_lock:
+            soil_values = None if force_refresh else self.release_cache.get(release_key)
+            
+            if soil_values is None:
+                soil_values = self._fetch_soil_data_with_fallback(latitude, longitude, year)
+                # A failed fetch is not memoized, so the next month tries again;
+                # genuine misses are memoized in memory for this run only, not persisted
+                if not soil_values.pop('_fetch_failed', False):
+                    self.release_cache.put(release_key, soil_values, persist=soil_values.get('sand') is not None)
+            else:
+                self.logger.debug("📦 Using memoized SoilGrids data for %s", release_key)
+        
+        # Stamp the release metadata for the requested year
+        soil_values = dict(soil_values)
+        if soil_values.get('sand') is not None:
+            soil_values['_version_year'] = version_info['version_year']
+            soil_values['_collection_used'] = version_info['collection']
+            soil_values['_temporal_reasoning'] = version_info.get('reasoning', 'unknown')
+        return soil_values
+    
     def _get_soil_version_for_year(self, year: int) -> Dict:
         """Get SoilGrids version that was ACTUALLY AVAILABLE for a given year"""
         for (start_year, end_year), version_info in self.soil_versions.items():
@@ -247,7 +1241,7 @@ class TemporalSoilDataHandler:
                 else:
                     temporal_note = " (current data)"
                 
-                self.logger.debug(f"📅 Year {year} → SoilGrids {version_info['version_year']}{temporal_note}")
+                self.logger.debug("📅 Year %d → SoilGrids %s%s", year, version_info['version_year'], temporal_note)
                 return version_info
         
         # Default to latest if year is outside our range
@@ -309,10 +1303,11 @@ class TemporalSoilDataHandler:
             converted['nitrogen'] = None
         
         # ✅ ADD DEBUG LOGGING TO VERIFY THE FIX
-        texture_sum = sum([converted.get(prop, 0) for prop in ['sand', 'silt', 'clay']])
-        self.logger.debug(f"Soil texture conversion - Raw: {soil_data_raw}")
-        self.logger.debug(f"Soil texture conversion - Converted: {converted}")
-        self.logger.debug(f"Soil texture sum: {texture_sum:.1f}%")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            texture_sum = sum([converted.get(prop, 0) for prop in ['sand', 'silt', 'clay']])
+            self.logger.debug("Soil texture conversion - Raw: %s", soil_data_raw)
+            self.logger.debug("Soil texture conversion - Converted: %s", converted)
+            self.logger.debug("Soil texture sum: %.1f%%", texture_sum)
         
         return converted
     
@@ -328,7 +1323,7 @@ class TemporalSoilDataHandler:
             silt = soil_props.get('silt', 0)
             ph = soil_props.get('ph', 7.0)
             
-            self.logger.debug(f"Estimating P&K from: SOC={soc}, CEC={cec}, Clay={clay}, Silt={silt}, pH={ph}")
+            self.logger.debug("Estimating P&K from: SOC=%s, CEC=%s, Clay=%s, Silt=%s, pH=%s", soc, cec, clay, silt, ph)
             
             # Ensure we have basic values
             if soc is None or cec is None or clay is None:
@@ -360,7 +1355,7 @@ class TemporalSoilDataHandler:
             except:
                 potassium = 180.0  # Default for Egyptian soils
             
-            self.logger.debug(f"Estimated P={phosphorus} mg/kg, K={potassium} mg/kg")
+            self.logger.debug("Estimated P=%s mg/kg, K=%s mg/kg", phosphorus, potassium)
             return phosphorus, potassium
             
         except Exception as e:
@@ -368,7 +1363,7 @@ class TemporalSoilDataHandler:
             # Return reasonable defaults for Egyptian soils
             return 18.5, 180.0
     
-    def _get_nitrogen_fallback(self, soil_props: Dict) -> float:
+    def _get_nitrogen_fallback(self, soil_props: Dict, task_key: Tuple = ()) -> float:
         """
         Estimate nitrogen from SOC if direct measurement fails
         Typical N:SOC ratio is about 1:10 to 1:12
@@ -378,7 +1373,7 @@ class TemporalSoilDataHandler:
             if soc is not None and soc > 0:
                 # Conservative estimate: N = SOC / 11
                 nitrogen = soc / 11.0
-                self.logger.info(f"📊 Estimated nitrogen from SOC: {nitrogen:.3f}%")
+                self.logger.info("📊 Estimated nitrogen from SOC: %.3f%%", nitrogen, extra=task_log(*task_key))
                 return round(nitrogen, 3)
             return None
         except:
@@ -388,11 +1383,23 @@ class TemporalSoilDataHandler:
         """Check if location is in Alexandria area"""
         return (30.8 <= latitude <= 31.5) and (29.5 <= longitude <= 30.2)
     
-    def _fetch_temporal_soil_data(self, latitude: float, longitude: float, year: int) -> Dict:
-        """Fetch soil data using historically appropriate version for the year"""
+    def _fetch_temporal_soil_data(
+        self,
+        latitude: float,
+        longitude: float,
+        year: int,
+        alternatives: Optional[List[Tuple[float, float]]] = None
+    ) -> Dict:
+        """
+        Fetch soil data using historically appropriate version for the year
+        
+        The original point and any alternative coordinates are sampled at every
+        scale in Config.SOIL_SCALES within ONE request; the first non-null sample
+        in priority order (candidate, then scale) is picked server-side.
+        """
+        empty = {prop: None for prop in ['sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec', 'nitrogen']}
+        
         try:
-            point = ee.Geometry.Point([longitude, latitude])
-            
             # Get appropriate SoilGrids version
             version_info = self._get_soil_version_for_year(year)
             band_names = self._get_correct_band_names(version_info)
@@ -408,7 +1415,10 @@ class TemporalSoilDataHandler:
             else:
                 context = f"(using latest available data)"
             
-            self.logger.info(f"🌱 Year {year} → SoilGrids {release_year} {context}")
+            self.logger.info(
+                "🌱 Year %d → SoilGrids %s %s", year, release_year, context,
+                extra=task_log(latitude, longitude, year)
+            )
             
             # Load soil layers for the specific version
             sand = ee.Image(f"{collection_base}/sand_mean").select(band_names['sand'])
@@ -424,64 +1434,80 @@ class TemporalSoilDataHandler:
             soil_image = ee.Image.cat([sand, silt, clay, soc, ph, bdod, cec, nitrogen]) \
                 .rename(['sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec', 'nitrogen'])
             
-            # Try different scales
-            for scale in [1000, 2000, 5000]:
-                self.logger.debug(f"  Trying scale: {scale}m for year {year}")
-                
-                soil_data_raw = soil_image.reduceRegion(
-                    reducer=ee.Reducer.first(),
-                    geometry=point,
-                    scale=scale,
-                    bestEffort=True,
-                    maxPixels=1e9,
-                    tileScale=2
-                ).getInfo()
-                
-                # Check if we got data
-                if soil_data_raw.get('sand') is not None:
-                    self.logger.debug(f"  ✅ Got temporal soil data at scale {scale}m for {year}")
-                    
-                    # Convert raw values to proper units
-                    converted_data = self._convert_soil_values(soil_data_raw)
-                    converted_data['_scale_used'] = scale
-                    converted_data['_version_year'] = release_year
-                    converted_data['_collection_used'] = collection_base
-                    converted_data['_temporal_reasoning'] = reasoning
-                    
-                    return converted_data
+            # One sample per (candidate, scale), ranked in the order they used to be tried
+            candidates = [(latitude, longitude)] + list(alternatives or [])
+            samples = []
+            for candidate, (cand_lat, cand_lon) in enumerate(candidates):
+                point = ee.Geometry.Point([cand_lon, cand_lat])
+                for scale in Config.SOIL_SCALES:
+                    values = soil_image.reduceRegion(
+                        reducer=ee.Reducer.first(),
+                        geometry=point,
+                        scale=scale,
+                        bestEffort=True,
+                        maxPixels=1e9,
+                        tileScale=2
+                    )
+                    samples.append(
+                        ee.Feature(None, values).set({
+                            '_rank': len(samples),
+                            '_candidate': candidate,
+                            '_scale_used': scale
+                        })
+                    )
+            
+            self.logger.debug(
+                "  Sampling %d point(s) x %d scales for year %d", len(candidates), len(Config.SOIL_SCALES), year
+            )
             
-            # All scales failed
-            return {prop: None for prop in ['sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec', 'nitrogen']}
+            best = self.ee_client.get_info(
+                ee.FeatureCollection(samples)
+                    .filter(ee.Filter.notNull(['sand']))
+                    .sort('_rank')
+                    .first(),
+                f"Soil {year} ({len(samples)} samples)",
+                stage='ee.soil'
+            )
+            
+            # All candidates and scales failed
+            if not best:
+                return empty
+            
+            soil_data_raw = best['properties']
+            candidate = soil_data_raw['_candidate']
+            scale = soil_data_raw['_scale_used']
+            self.logger.debug("  ✅ Got temporal soil data at scale %sm for %d", scale, year)
+            
+            # Convert raw values to proper units
+            converted_data = self._convert_soil_values(soil_data_raw)
+            converted_data['_scale_used'] = scale
+            converted_data['_version_year'] = release_year
+            converted_data['_collection_used'] = collection_base
+            converted_data['_temporal_reasoning'] = reasoning
+            
+            if candidate > 0:
+                self.logger.info(f"✅ Found soil data at alternative location {candidate}")
+                converted_data['_is_alternative'] = True
+                converted_data['_original_lat'] = latitude
+                converted_data['_original_lon'] = longitude
+            
+            return converted_data
             
         except Exception as e:
             self.logger.error(f"❌ Temporal soil data fetch failed for {year}: {e}")
-            return {prop: None for prop in ['sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec', 'nitrogen']}
+            # Flagged so the caller doesn't memoize an error as "no data here"
+            return {**empty, '_fetch_failed': True}
     
     def _fetch_soil_data_with_fallback(self, latitude: float, longitude: float, year: int) -> Dict:
-        """Fetch soil data with multiple fallback strategies"""
-        # Try original location first
-        soil_data = self._fetch_temporal_soil_data(latitude, longitude, year)
-        
-        if soil_data['sand'] is not None:
-            return soil_data
+        """Fetch soil data with multiple fallback strategies - all in one request"""
+        alternatives = None
         
-        # If Alexandria area and failed, try alternatives
+        # If Alexandria area, alternatives are sampled alongside the original point
         if self._is_alexandria_area(latitude, longitude):
-            self.logger.info(f"🔍 Alexandria area detected, trying alternative coordinates...")
-            
-            for i, (alt_lat, alt_lon) in enumerate(self.alexandria_alternatives):
-                self.logger.info(f"  Trying alternative {i+1}: ({alt_lat:.3f}, {alt_lon:.3f})")
-                
-                alt_data = self._fetch_temporal_soil_data(alt_lat, alt_lon, year)
-                
-                if alt_data['sand'] is not None:
-                    self.logger.info(f"✅ Found soil data at alternative location {i+1}")
-                    alt_data['_is_alternative'] = True
-                    alt_data['_original_lat'] = latitude
-                    alt_data['_original_lon'] = longitude
-                    return alt_data
+            self.logger.info(f"🔍 Alexandria area detected, sampling alternative coordinates too...")
+            alternatives = self.alexandria_alternatives
         
-        return soil_data
+        return self._fetch_temporal_soil_data(latitude, longitude, year, alternatives)
     
     def get_soil_data_for_date(
         self, 
@@ -494,13 +1520,16 @@ class TemporalSoilDataHandler:
         """Get historically appropriate soil data with temporal validation"""
         
         cache_key = self._create_cache_key(latitude, longitude, year)
+        refresh_release = force_refresh
         
         #  Check cache first, but don't return immediately
         soil_values = None
         use_cached = False
         
-        if cache_key in self.soil_cache and not force_refresh:
-            cached_data = self.soil_cache[cache_key].copy()
+        cached_data = None if force_refresh else self.soil_cache.get(cache_key)
+        
+        if cached_data is not None:
+            cached_data = cached_data.copy()
             
             # Check if cached data is TEMPORALLY CORRECT
             cached_version = cached_data.get('_metadata', {}).get('soilgrids_release_used')
@@ -512,18 +1541,29 @@ class TemporalSoilDataHandler:
                 cached_data.get('clay') is not None and
                 cached_data.get('clay') > 0
             ):
-                self.logger.debug(f"📦 Using cached temporal soil data for {year}")
+                self.logger.debug("📦 Using cached temporal soil data for %d", year)
                 use_cached = True
                 soil_values = cached_data
+                
+                # Restore fetch metadata from the cached entry
+                cached_meta = cached_data.get('_metadata', {})
+                soil_values['_version_year'] = cached_version
+                soil_values['_temporal_reasoning'] = cached_meta.get('temporal_reasoning', 'unknown')
+                soil_values['_scale_used'] = cached_meta.get('scale_used', 'unknown')
+                soil_values['_collection_used'] = cached_meta.get('collection_used', 'unknown')
+                soil_values['_is_alternative'] = cached_meta.get('is_alternative', False)
             else:
                 if cached_version != expected_version:
                     self.logger.warning(f"🔄 Cached soil data version mismatch: {cached_version} vs expected {expected_version}")
                 force_refresh = True
         
         # Fetch fresh data if needed
-        if not use_cached and (force_refresh or cache_key not in self.soil_cache):
-            self.logger.info(f"🔄 Fetching HISTORICALLY APPROPRIATE soil data for ({latitude:.3f}, {longitude:.3f}) - Year {year}")
-            soil_values = self._fetch_soil_data_with_fallback(latitude, longitude, year)
+        if not use_cached:
+            self.logger.info(
+                "🔄 Fetching HISTORICALLY APPROPRIATE soil data for (%.3f, %.3f) - Year %d",
+                latitude, longitude, year, extra=task_log(latitude, longitude, year, month)
+            )
+            soil_values = self._get_release_soil_values(latitude, longitude, year, refresh_release)
         
         #  Ensure soil_values is defined
         if soil_values is None:
@@ -542,10 +1582,13 @@ class TemporalSoilDataHandler:
 
         #  Handle missing nitrogen - estimate from SOC if needed
         if soil_values.get('nitrogen') is None and soil_values.get('sand') is not None:
-            estimated_nitrogen = self._get_nitrogen_fallback(soil_values)
+            estimated_nitrogen = self._get_nitrogen_fallback(soil_values, (latitude, longitude, year, month))
             if estimated_nitrogen is not None:
                 soil_values['nitrogen'] = estimated_nitrogen
-                self.logger.info(f"🔧 Using estimated nitrogen: {estimated_nitrogen:.3f}%")
+                self.logger.info(
+                    "🔧 Using estimated nitrogen: %.3f%%", estimated_nitrogen,
+                    extra=task_log(latitude, longitude, year, month)
+                )
         
         #  Estimate P and K with fallback
         phosphorus, potassium = self._estimate_phosphorus_potassium(soil_values)
@@ -579,80 +1622,143 @@ class TemporalSoilDataHandler:
         
         # Cache if successful and not using cached data
         if not use_cached and soil_data['sand'] is not None and soil_data['sand'] > 0:
-            texture_sum = sum([soil_data.get(prop, 0) for prop in ['sand', 'silt', 'clay']])
-            npk_info = f"N={soil_data.get('nitrogen', 0):.3f}%, P={phosphorus if phosphorus else 'N/A'}mg/kg, K={potassium if potassium else 'N/A'}mg/kg"
-            
-            # Improved logging with historical context
-            release_year = soil_data['_metadata']['soilgrids_release_used']
-            if year < release_year:
-                temporal_note = f" (using contemporary {release_year} data)"
-            else:
-                temporal_note = f" (using current {release_year} data)"
+            # Summary line is only built when INFO is on
+            if self.logger.isEnabledFor(logging.INFO):
+                texture_sum = sum([soil_data.get(prop, 0) for prop in ['sand', 'silt', 'clay']])
+                npk_info = f"N={soil_data.get('nitrogen', 0):.3f}%, P={phosphorus if phosphorus else 'N/A'}mg/kg, K={potassium if potassium else 'N/A'}mg/kg"
                 
+                # Improved logging with historical context
+                release_year = soil_data['_metadata']['soilgrids_release_used']
+                if year < release_year:
+                    temporal_note = f" (using contemporary {release_year} data)"
+                else:
+                    temporal_note = f" (using current {release_year} data)"
+                    
+                self.logger.info(
+                    "✅ Historical soil data for %d: Sand=%.1f%%, Silt=%.1f%%, Clay=%.1f%% (Total: %.1f%%)%s | %s",
+                    year, soil_data['sand'], soil_data['silt'], soil_data['clay'],
+                    texture_sum, temporal_note, npk_info, extra=task_log(latitude, longitude, year, month)
+                )
+            self.soil_cache.put(cache_key, soil_data)
+        elif use_cached:
             self.logger.info(
-                f"✅ Historical soil data for {year}: "
-                f"Sand={soil_data['sand']:.1f}%, "
-                f"Silt={soil_data['silt']:.1f}%, "
-                f"Clay={soil_data['clay']:.1f}% "
-                f"(Total: {texture_sum:.1f}%){temporal_note} | {npk_info}"
+                "📦 Using cached soil data for %d", year,
+                extra=task_log(latitude, longitude, year, month)
             )
-            self.soil_cache[cache_key] = soil_data
-            self._save_cache()
-        elif use_cached:
-            self.logger.info(f"📦 Using cached soil data for {year}")
         else:
             self.logger.error(f"❌ No valid historical soil data available for {year}")
         
         return soil_data
-# ==================== DATABASE MANAGER ====================
+# ==================== STORAGE BACKENDS ====================
 
-class DatabaseManager:
-    """Handles all database operations"""
+def define_historical_data_table(metadata: MetaData) -> Table:
+    """historical_data schema shared by every backend"""
+    return Table(
+        'historical_data', metadata,
+        Column('id', Integer, primary_key=True, autoincrement=True),
+        Column('location_name', String(100), nullable=False),
+        Column('latitude', Float),
+        Column('longitude', Float),
+        Column('year', Integer, nullable=False),
+        Column('month', Integer, nullable=False),
+        *[Column(col, Float) for col in [
+            'sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec',
+            'ndvi', 't2m_c', 'td2m_c', 'rh_pct', 'tp_m', 'ssrd_jm2'
+        ]],
+        Column('lc_type1', Integer),
+        Column('ndvi_source', String(50)),
+        Column('climate_source', String(50)),
+        Column('lc_source', String(50)),
+        Column('data_quality_score', Float),
+        Column('created_at', DateTime, server_default=func.current_timestamp()),
+        Column('updated_at', DateTime, server_default=func.current_timestamp()),
+        Column('nitrogen', Float),
+        Column('phosphorus', Float),
+        Column('potassium', Float),
+        Column('soil_version_year', Integer),
+        Column('soil_data_year', Integer),
+        Column('npk_estimation_method', String(100)),
+        Column('npk_correction_date', String(50)),
+        Column('soc_unit', String(20)),
+        Column('cec_unit', String(20)),
+        Index('ux_historical_data_location_year_month', 'location_name', 'year', 'month', unique=True),
+    )
+
+
+# Pandas dtypes for historical_data reads; nullable ints keep NULL as <NA>
+HISTORICAL_DATA_DTYPES = {
+    'year': 'Int16',
+    'month': 'Int8',
+    'lc_type1': 'Int16',
+    'soil_version_year': 'Int16',
+    'soil_data_year': 'Int16',
+    **{col: 'float64' for col in [
+        'latitude', 'longitude', 'sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec',
+        'ndvi', 't2m_c', 'td2m_c', 'rh_pct', 'tp_m', 'ssrd_jm2',
+        'data_quality_score', 'nitrogen', 'phosphorus', 'potassium'
+    ]},
+}
+
+
+class StorageBackend(ABC):
+    """
+    Base storage backend
+    
+    Holds the SQLAlchemy Core implementation shared by all backends; subclasses
+    provide the engine and the dialect-specific upsert.
+    """
+    
+    name = 'base'
+    creates_schema = False  # Run create_all on connect even without Config.DB_CREATE_SCHEMA
     
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.engine = None
-        self._setup_connection()
+        self._tables = {}
+        self._tables_lock = threading.Lock()
     
-    def _setup_connection(self):
-        """Setup SQLAlchemy engine"""
+    @abstractmethod
+    def _create_engine(self):
+        """Build the SQLAlchemy engine for this backend"""
+    
+    def connect(self):
+        """Setup SQLAlchemy engine and make sure the schema exists"""
         try:
-            self.connection_string = (
-                f"mssql+pyodbc://@{Config.DB_SERVER}/{Config.DB_NAME}"
-                f"?driver={Config.DB_DRIVER.replace(' ', '+')}"
-                f"&trusted_connection=yes"
-            )
-            
-            self.engine = create_engine(
-                self.connection_string,
-                pool_size=5,
-                max_overflow=10,
-                pool_pre_ping=True,
-                pool_recycle=3600,
-                echo=False
-            )
+            self.engine = self._create_engine()
             
             # Test connection
             with self.engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
             
-            self.logger.info("✅ Database connection established")
+            # Creates the table and unique key index only if missing; a production
+            # server schema is managed explicitly, not on every pipeline start
+            if self.creates_schema or Config.DB_CREATE_SCHEMA:
+                define_historical_data_table(MetaData()).metadata.create_all(self.engine, checkfirst=True)
+            
+            self.logger.info(f"✅ Database connection established ({self.name})")
             
         except Exception as e:
             self.logger.error(f"❌ Database connection failed: {e}")
             raise
     
+    def _get_table(self, table_name: str) -> Table:
+        """Reflect a table once and reuse its metadata"""
+        with self._tables_lock:
+            if table_name not in self._tables:
+                self._tables[table_name] = Table(table_name, MetaData(), autoload_with=self.engine)
+            return self._tables[table_name]
+    
+    @staticmethod
+    def _to_records(df: pd.DataFrame) -> List[Dict]:
+        """DataFrame rows as dicts with NaN converted to None (SQL NULL)"""
+        columns = list(df.columns)
+        values = df.astype(object).where(df.notna(), None).to_numpy()
+        return [dict(zip(columns, row)) for row in values]
+    
     def bulk_insert(self, df: pd.DataFrame, table_name: str, if_exists: str = 'append') -> int:
-        """Insert DataFrame using SQLAlchemy Core API"""
+        """Insert DataFrame using SQLAlchemy Core API (executemany in chunks, one transaction)"""
         try:
-            from sqlalchemy import MetaData, Table
-            
-            # Reflect table structure
-            metadata = MetaData()
-            table = Table(table_name, metadata, autoload_with=self.engine)
-            
-            # Get records as dictionaries
-            records = df.to_dict('records')
+            table = self._get_table(table_name)
             
             with self.engine.begin() as connection:
                 # Handle if_exists logic
@@ -660,7 +1766,9 @@ class DatabaseManager:
                     connection.execute(table.delete())
                 
                 # Insert records
-                connection.execute(table.insert(), records)
+                for start in range(0, len(df), Config.INSERT_CHUNK_ROWS):
+                    chunk = df.iloc[start:start + Config.INSERT_CHUNK_ROWS]
+                    connection.execute(table.insert(), self._to_records(chunk))
             
             self.logger.info(f"✅ Inserted {len(df)} rows into {table_name}")
             return len(df)
@@ -668,7 +1776,17 @@ class DatabaseManager:
         except Exception as e:
             self.logger.error(f"❌ Bulk insert failed: {e}")
             raise
-
+    
+    @abstractmethod
+    def upsert(
+        self,
+        df: pd.DataFrame,
+        table_name: str,
+        key_columns: Tuple[str, ...] = Config.UPSERT_KEY_COLUMNS,
+        insert_missing: bool = True
+    ) -> int:
+        """Update rows matching key_columns and (optionally) insert the rest"""
+    
     def check_existing_data(self, location: str, year: int, month: int) -> bool:
         """Check if data already exists"""
         query = """
@@ -687,6 +1805,320 @@ class DatabaseManager:
         except Exception as e:
             self.logger.warning(f"⚠️ Error checking existing data: {e}")
             return False
+    
+    def get_existing_keys(
+        self,
+        start_year: int,
+        end_year: int,
+        location: Optional[str] = None
+    ) -> Set[Tuple[str, int, int]]:
+        """Load all existing (location_name, year, month) keys in one query"""
+        query = """
+            SELECT DISTINCT location_name, year, month
+            FROM historical_data
+            WHERE year BETWEEN :start_year AND :end_year
+        """
+        params = {"start_year": start_year, "end_year": end_year}
+        if location is not None:
+            query += " AND location_name = :location_name"
+            params["location_name"] = location
+        
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(text(query), params)
+                keys = {(row[0], int(row[1]), int(row[2])) for row in result}
+            self.logger.info(f"🔑 Loaded {len(keys)} existing keys ({start_year}-{end_year})")
+            return keys
+        except Exception as e:
+            self.logger.warning(f"⚠️ Error loading existing keys: {e}")
+            return set()
+    
+    def read_chunks(self, query: str, params: Optional[Dict] = None, chunksize: int = 10000):
+        """Yield query results as DataFrames of at most chunksize rows"""
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            for chunk in pd.read_sql(text(query), conn, params=params or {}, chunksize=chunksize):
+                yield chunk
+    
+    def read_historical_data(
+        self,
+        locations: Optional[List[str]] = None,
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        min_quality: Optional[float] = None,
+        columns: Optional[List[str]] = None,
+        chunksize: Optional[int] = None,
+        as_arrow: bool = False
+    ):
+        """
+        Stream historical_data in typed chunks
+        
+        Filters are pushed down into the WHERE clause and rows are fetched
+        through a streaming cursor, so memory stays bounded by chunksize.
+        Yields DataFrames, or pyarrow RecordBatches when as_arrow=True.
+        """
+        table = self._get_table('historical_data')
+        selected = [table.c[col] for col in columns] if columns else [table]
+        
+        query = select(*selected)
+        if locations:
+            query = query.where(table.c.location_name.in_(list(locations)))
+        if start_year is not None:
+            query = query.where(table.c.year >= start_year)
+        if end_year is not None:
+            query = query.where(table.c.year <= end_year)
+        if min_quality is not None:
+            query = query.where(table.c.data_quality_score >= min_quality)
+        query = query.order_by(table.c.location_name, table.c.year, table.c.month)
+        
+        if as_arrow:
+            import pyarrow as pa  # optional dependency, only needed for Arrow output
+        
+        chunksize = chunksize or Config.READ_CHUNK_ROWS
+        total = 0
+        with self.engine.connect().execution_options(stream_results=True, yield_per=chunksize) as conn:
+            result = conn.execute(query)
+            names = list(result.keys())
+            for rows in result.partitions(chunksize):
+                chunk = pd.DataFrame.from_records(rows, columns=names)
+                chunk = chunk.astype({
+                    col: dtype for col, dtype in HISTORICAL_DATA_DTYPES.items() if col in chunk.columns
+                })
+                total += len(chunk)
+                yield pa.RecordBatch.from_pandas(chunk, preserve_index=False) if as_arrow else chunk
+        
+        self.logger.info(f"📤 Streamed {total} rows from historical_data")
+
+
+class SqlServerBackend(StorageBackend):
+    """SQL Server over pyodbc (trusted connection to Config.DB_SERVER)"""
+    
+    name = 'mssql'
+    
+    def _create_engine(self):
+        self.connection_string = (
+            f"mssql+pyodbc://@{Config.DB_SERVER}/{Config.DB_NAME}"
+            f"?driver={Config.DB_DRIVER.replace(' ', '+')}"
+            f"&trusted_connection=yes"
+        )
+        
+        return create_engine(
+            self.connection_string,
+            pool_size=5,
+            max_overflow=10,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+            fast_executemany=True,  # pyodbc array binding for executemany
+            echo=False
+        )
+    
+    def upsert(
+        self,
+        df: pd.DataFrame,
+        table_name: str,
+        key_columns: Tuple[str, ...] = Config.UPSERT_KEY_COLUMNS,
+        insert_missing: bool = True
+    ) -> int:
+        """
+        Idempotent set-based upsert through a staging table
+        
+        The batch is bulk-loaded into a session temp table and applied with a
+        single MERGE keyed on key_columns. Only the columns present in df are
+        updated, so re-collecting one variable is a keys + column DataFrame.
+        """
+        try:
+            table = self._get_table(table_name)
+            
+            # MERGE rejects duplicate source keys - keep the latest row
+            df = df.drop_duplicates(subset=list(key_columns), keep='last')
+            columns = [col for col in df.columns if col in table.columns]
+            update_columns = [col for col in columns if col not in key_columns]
+            
+            staging = Table(
+                f"#{table_name}_staging",
+                MetaData(),
+                *[Column(col, table.columns[col].type) for col in columns]
+            )
+            
+            on_clause = " AND ".join(f"target.[{col}] = source.[{col}]" for col in key_columns)
+            merge_sql = f"MERGE INTO [{table_name}] WITH (HOLDLOCK) AS target USING [{staging.name}] AS source ON {on_clause}"
+            if update_columns:
+                merge_sql += " WHEN MATCHED THEN UPDATE SET " + ", ".join(
+                    f"target.[{col}] = source.[{col}]" for col in update_columns
+                )
+            if insert_missing:
+                merge_sql += (
+                    " WHEN NOT MATCHED BY TARGET THEN INSERT ("
+                    + ", ".join(f"[{col}]" for col in columns)
+                    + ") VALUES ("
+                    + ", ".join(f"source.[{col}]" for col in columns)
+                    + ")"
+                )
+            merge_sql += ";"
+            
+            with self.engine.begin() as connection:
+                staging.create(connection)
+                for start in range(0, len(df), Config.INSERT_CHUNK_ROWS):
+                    chunk = df[columns].iloc[start:start + Config.INSERT_CHUNK_ROWS]
+                    connection.execute(staging.insert(), self._to_records(chunk))
+                
+                affected = connection.execute(text(merge_sql)).rowcount
+                staging.drop(connection)
+            
+            self.logger.info(f"✅ Upserted {len(df)} rows into {table_name} ({affected} affected)")
+            return affected
+            
+        except Exception as e:
+            self.logger.error(f"❌ Upsert failed: {e}")
+            raise
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite file (Config.SQLITE_PATH) for local runs, CI and benchmarks"""
+    
+    name = 'sqlite'
+    creates_schema = True
+    
+    def __init__(self, db_path: Optional[Path] = None):
+        super().__init__()
+        self.db_path = Path(db_path or Config.SQLITE_PATH)
+    
+    def _create_engine(self):
+        engine = create_engine(
+            f"sqlite:///{self.db_path}",
+            connect_args={'check_same_thread': False, 'timeout': 30},
+            echo=False
+        )
+        
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+        
+        return engine
+    
+    def upsert(
+        self,
+        df: pd.DataFrame,
+        table_name: str,
+        key_columns: Tuple[str, ...] = Config.UPSERT_KEY_COLUMNS,
+        insert_missing: bool = True
+    ) -> int:
+        """
+        Idempotent upsert keyed on key_columns
+        
+        Uses INSERT ... ON CONFLICT DO UPDATE against the unique key index;
+        only the columns present in df are updated.
+        """
+        try:
+            table = self._get_table(table_name)
+            
+            df = df.drop_duplicates(subset=list(key_columns), keep='last')
+            columns = [col for col in df.columns if col in table.columns]
+            update_columns = [col for col in columns if col not in key_columns]
+            
+            if insert_missing:
+                statement = sqlite_insert(table)
+                if update_columns:
+                    statement = statement.on_conflict_do_update(
+                        index_elements=list(key_columns),
+                        set_={col: statement.excluded[col] for col in update_columns}
+                    )
+                else:
+                    statement = statement.on_conflict_do_nothing(index_elements=list(key_columns))
+            else:
+                statement = table.update().where(
+                    *[table.c[col] == bindparam(f"key_{col}") for col in key_columns]
+                ).values({col: bindparam(col) for col in update_columns})
+            
+            affected = 0
+            with self.engine.begin() as connection:
+                for start in range(0, len(df), Config.INSERT_CHUNK_ROWS):
+                    records = self._to_records(df[columns].iloc[start:start + Config.INSERT_CHUNK_ROWS])
+                    if not insert_missing:
+                        records = [
+                            {**{f"key_{col}": rec[col] for col in key_columns},
+                             **{col: rec[col] for col in update_columns}}
+                            for rec in records
+                        ]
+                    affected += connection.execute(statement, records).rowcount
+            
+            self.logger.info(f"✅ Upserted {len(df)} rows into {table_name} ({affected} affected)")
+            return affected
+            
+        except Exception as e:
+            self.logger.error(f"❌ Upsert failed: {e}")
+            raise
+
+
+# ==================== DATABASE MANAGER ====================
+
+class DatabaseManager:
+    """Handles all database operations through the configured storage backend"""
+    
+    BACKENDS = {
+        'mssql': SqlServerBackend,
+        'sqlite': SQLiteBackend,
+    }
+    
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.backend = backend or self.BACKENDS[Config.DB_BACKEND]()
+        self.backend.connect()
+        self.engine = self.backend.engine
+    
+    def bulk_insert(self, df: pd.DataFrame, table_name: str, if_exists: str = 'append') -> int:
+        """Insert DataFrame rows"""
+        with METRICS.timer('db.bulk_insert') as sample:
+            sample['bytes'] = _payload_bytes(df)
+            return self.backend.bulk_insert(df, table_name, if_exists)
+    
+    def upsert(
+        self,
+        df: pd.DataFrame,
+        table_name: str,
+        key_columns: Tuple[str, ...] = Config.UPSERT_KEY_COLUMNS,
+        insert_missing: bool = True
+    ) -> int:
+        """Insert or update rows keyed on key_columns"""
+        with METRICS.timer('db.upsert') as sample:
+            sample['bytes'] = _payload_bytes(df)
+            return self.backend.upsert(df, table_name, key_columns, insert_missing)
+    
+    def check_existing_data(self, location: str, year: int, month: int) -> bool:
+        """Check if data already exists"""
+        with METRICS.timer('db.check_existing'):
+            return self.backend.check_existing_data(location, year, month)
+    
+    def get_existing_keys(
+        self,
+        start_year: int,
+        end_year: int,
+        location: Optional[str] = None
+    ) -> Set[Tuple[str, int, int]]:
+        """Load all existing (location_name, year, month) keys in one query"""
+        with METRICS.timer('db.existing_keys'):
+            return self.backend.get_existing_keys(start_year, end_year, location)
+    
+    def read_chunks(self, query: str, params: Optional[Dict] = None, chunksize: int = 10000):
+        """Yield query results as DataFrames of at most chunksize rows"""
+        return METRICS.iterate('db.read_chunk', self.backend.read_chunks(query, params, chunksize))
+    
+    def read_historical_data(
+        self,
+        locations: Optional[List[str]] = None,
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        min_quality: Optional[float] = None,
+        columns: Optional[List[str]] = None,
+        chunksize: Optional[int] = None,
+        as_arrow: bool = False
+    ):
+        """Stream filtered historical_data rows in typed chunks"""
+        return METRICS.iterate('db.read_chunk', self.backend.read_historical_data(
+            locations, start_year, end_year, min_quality, columns, chunksize, as_arrow
+        ))
 
 
 # ==================== DATA COLLECTOR (WITH RETRY LOGIC & TEMPORAL SOIL) ====================
@@ -696,10 +2128,13 @@ class IntegratedDataCollector:
     
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
+        
+        # Every getInfo() goes through one shared, rate-limited client
+        self.ee_client = EarthEngineClient()
         self._initialize_ee()
         
         # Initialize TEMPORAL soil handler
-        self.soil_handler = TemporalSoilDataHandler()
+        self.soil_handler = TemporalSoilDataHandler(ee_client=self.ee_client)
         
         # Load other datasets
         self._load_datasets()
@@ -708,7 +2143,7 @@ class IntegratedDataCollector:
         """Initialize Earth Engine"""
         try:
             self.logger.info("🌍 Initializing Google Earth Engine...")
-            ee.Initialize(project=Config.GEE_PROJECT_ID)
+            self.ee_client.initialize(Config.GEE_PROJECT_ID)
             self.logger.info("✅ Earth Engine initialized")
         except Exception as e:
             self.logger.error(f"❌ Earth Engine initialization failed: {e}")
@@ -726,28 +2161,19 @@ class IntegratedDataCollector:
             # Land Cover
             self.land_cover = ee.Image('ESA/WorldCover/v100/2020').select('Map')
             
+            # Time-invariant layers - one lookup per location for all months
+            self.static_layers = StaticLayerCache(self.ee_client)
+            self.static_layers.register('land_cover', self.land_cover, 'Map', ee.Reducer.mode)
+            
             self.logger.info("✅ Datasets loaded")
             
         except Exception as e:
             self.logger.error(f"❌ Dataset loading failed: {e}")
             raise
     
-    def _fetch_with_retry(self, operation: Callable, operation_name: str, max_retries: int = 3) -> any:
-        """Fetch data with retry logic for network issues"""
-        for attempt in range(max_retries):
-            try:
-                return operation()
-            except Exception as e:
-                if "Connection aborted" in str(e) or "Remote end closed" in str(e):
-                    self.logger.warning(f"⚠️ {operation_name} - Network error (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 5  # Exponential backoff: 5, 10, 15 seconds
-                        self.logger.info(f"🔄 Retrying in {wait_time} seconds...")
-                        time.sleep(wait_time)
-                        continue
-                # For other errors or final retry failure, re-raise
-                raise
-        return None
+    def _get_info(self, computed, operation_name: str, stage: str = 'ee.other') -> any:
+        """Evaluate an ee object through the shared rate-limited client"""
+        return self.ee_client.get_info(computed, operation_name, stage)
     
     def get_monthly_data(
         self, 
@@ -769,204 +2195,61 @@ class IntegratedDataCollector:
             # ========================================================
             # 1. TEMPORAL SOIL DATA - DIFFERENT FOR EACH YEAR
             # ========================================================
-            self.logger.debug(f"🌱 Fetching TEMPORAL soil data for {year}...")
-            
-            soil_data = self.soil_handler.get_soil_data_for_date(
-                latitude=latitude,
-                longitude=longitude,
-                year=year,
-                month=month,
-                force_refresh=True  # ✅ FORCE REFRESH TO GET TEMPORAL DATA
-            )
-            
-            # Add soil properties INCLUDING NPK
-            for prop in ['sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec', 'nitrogen', 'phosphorus', 'potassium']:
-                result[prop] = soil_data.get(prop)
-            
-            # Add temporal metadata
-            result['soil_version_year'] = soil_data['_metadata']['soilgrids_release_used']  # CORRECTED
-            result['soil_data_year'] = soil_data['_metadata']['data_represented_year']  # CORRECTED
-            
-            # ========================================================
-            # 2. NDVI
-            # ========================================================
-            self.logger.debug(f"🌿 Fetching NDVI...")
-            
-            ndvi_filtered = self.ndvi_collection.filterDate(start_date, end_date).filterBounds(point)
-            ndvi_count = ndvi_filtered.size().getInfo()
-            
-            if ndvi_count > 0:
-                ndvi_img = ndvi_filtered.mean().multiply(0.0001)
-                ndvi_value = ndvi_img.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=point,
-                    scale=Config.SCALE_METERS,
-                    bestEffort=True,
-                    maxPixels=1e9
-                ).get('NDVI').getInfo()
-                
-                result['ndvi'] = ndvi_value
-                result['ndvi_source'] = 'MODIS/MOD13A2'
-            else:
-                # Extended lookback
-                extended_start = start_date.advance(-2, 'month')
-                ndvi_filtered_extended = self.ndvi_collection.filterDate(
-                    extended_start, end_date
-                ).filterBounds(point)
-                
-                if ndvi_filtered_extended.size().getInfo() > 0:
-                    ndvi_img = ndvi_filtered_extended.mean().multiply(0.0001)
-                    ndvi_value = ndvi_img.reduceRegion(
-                        reducer=ee.Reducer.mean(),
-                        geometry=point,
-                        scale=Config.SCALE_METERS,
-                        bestEffort=True,
-                        maxPixels=1e9
-                    ).get('NDVI').getInfo()
-                    
-                    result['ndvi'] = ndvi_value
-                    result['ndvi_source'] = 'MODIS/MOD13A2_extended'
-                else:
-                    result['ndvi'] = None
-                    result['ndvi_source'] = None
+            self._add_soil_data(result, latitude, longitude, year, month)
             
             # ========================================================
-            # 3. ERA5 CLIMATE - FIXED VERSION WITH RETRY
+            # 2-3. NDVI + ERA5 CLIMATE - ONE SERVER-SIDE EVALUATION
             # ========================================================
-            self.logger.debug(f"🌡️ Fetching climate data...")
+            self.logger.debug("🌿 Fetching NDVI and climate data...")
             
             # CRITICAL FIX: Add .filterBounds(point)
             era5_filtered = self.era5_collection.filterDate(start_date, end_date).filterBounds(point)
-            era5_count = era5_filtered.size().getInfo()
+            has_era5, era5_values = self._era5_expression(era5_filtered, buffer_point)
             
-            self.logger.debug(f"   ERA5 images available: {era5_count}")
+            # NDVI window (primary / extended) and ERA5 availability are chosen
+            # server-side, so no size() probes are needed
+            values = self._get_info(
+                ee.Dictionary({
+                    'ndvi': self._ndvi_expression(point, start_date, end_date),
+                    'era5': era5_values,
+                    'has_era5': has_era5
+                }),
+                "NDVI + ERA5",
+                stage='ee.ndvi_era5'
+            )
             
-            if era5_count > 0:
-                # Temperature (2m) - Use correct band name from diagnostic
-                try:
-                    def get_temperature():
-                        t2m = era5_filtered.select('temperature_2m').mean()
-                        return t2m.reduceRegion(
-                            reducer=ee.Reducer.mean(),
-                            geometry=buffer_point,
-                            scale=Config.ERA5_SCALE,
-                            bestEffort=True,
-                            maxPixels=1e9
-                        ).getInfo()
-                    
-                    t2m_result = self._fetch_with_retry(get_temperature, "Temperature")
-                    
-                    t2m_value = t2m_result.get('temperature_2m') if t2m_result else None
-                    if t2m_value is not None:
-                        result['t2m_c'] = t2m_value - 273.15
-                        self.logger.debug(f"   ✅ Temperature: {result['t2m_c']:.2f}°C")
-                    else:
-                        result['t2m_c'] = None
-                        self.logger.warning(f"   ⚠️ Temperature is None")
-                except Exception as e:
-                    self.logger.error(f"   ❌ Temperature fetch error: {e}")
-                    result['t2m_c'] = None
-                
-                # Dewpoint Temperature (2m)
-                try:
-                    def get_dewpoint():
-                        td2m = era5_filtered.select('dewpoint_temperature_2m').mean()
-                        return td2m.reduceRegion(
-                            reducer=ee.Reducer.mean(),
-                            geometry=buffer_point,
-                            scale=Config.ERA5_SCALE,
-                            bestEffort=True,
-                            maxPixels=1e9
-                        ).getInfo()
-                    
-                    td2m_result = self._fetch_with_retry(get_dewpoint, "Dewpoint")
-                    
-                    td2m_value = td2m_result.get('dewpoint_temperature_2m') if td2m_result else None
-                    if td2m_value is not None:
-                        result['td2m_c'] = td2m_value - 273.15
-                        self.logger.debug(f"   ✅ Dewpoint: {result['td2m_c']:.2f}°C")
-                    else:
-                        result['td2m_c'] = None
-                        self.logger.warning(f"   ⚠️ Dewpoint is None")
-                except Exception as e:
-                    self.logger.error(f"   ❌ Dewpoint fetch error: {e}")
-                    result['td2m_c'] = None
+            result['ndvi'] = values['ndvi'].get('ndvi')
+            result['ndvi_source'] = values['ndvi'].get('ndvi_source')
+            
+            if values.get('has_era5'):
+                result.update(self._split_era5_values(values.get('era5') or {}))
                 
-                # Calculate Relative Humidity
-                if result.get('t2m_c') is not None and result.get('td2m_c') is not None:
-                    result['rh_pct'] = self._compute_rh(result['t2m_c'], result['td2m_c'])
-                    self.logger.debug(f"   ✅ Humidity: {result['rh_pct']:.1f}%")
+                if result['t2m_c'] is not None:
+                    self.logger.debug("   ✅ Temperature: %.2f°C", result['t2m_c'])
                 else:
-                    result['rh_pct'] = None
-                    self.logger.warning(f"   ⚠️ Cannot calculate humidity")
-                
-                # Precipitation - Use correct band name
-                try:
-                    def get_precipitation():
-                        tp = era5_filtered.select('total_precipitation').sum()
-                        return tp.reduceRegion(
-                            reducer=ee.Reducer.mean(),
-                            geometry=buffer_point,
-                            scale=Config.ERA5_SCALE,
-                            bestEffort=True,
-                            maxPixels=1e9
-                        ).getInfo()
-                    
-                    tp_result = self._fetch_with_retry(get_precipitation, "Precipitation")
-                    
-                    tp_value = tp_result.get('total_precipitation') if tp_result else None
-                    result['tp_m'] = tp_value if tp_value is not None else 0.0
-                    self.logger.debug(f"   ✅ Precipitation: {result['tp_m']:.6f}m")
-                except Exception as e:
-                    self.logger.error(f"   ❌ Precipitation fetch error: {e}")
-                    result['tp_m'] = 0.0
-                
-                # Solar Radiation - Use correct band name WITH RETRY
-                try:
-                    def get_solar_radiation():
-                        ssrd = era5_filtered.select('surface_solar_radiation_downwards').sum()
-                        return ssrd.reduceRegion(
-                            reducer=ee.Reducer.mean(),
-                            geometry=buffer_point,
-                            scale=Config.ERA5_SCALE,
-                            bestEffort=True,
-                            maxPixels=1e9
-                        ).getInfo()
-                    
-                    ssrd_result = self._fetch_with_retry(get_solar_radiation, "Solar Radiation")
-                    
-                    ssrd_value = ssrd_result.get('surface_solar_radiation_downwards') if ssrd_result else None
-                    result['ssrd_jm2'] = ssrd_value if ssrd_value is not None else 0.0
-                    self.logger.debug(f"   ✅ Solar: {result['ssrd_jm2']:.0f} J/m²")
-                except Exception as e:
-                    self.logger.error(f"   ❌ Solar radiation fetch error: {e}")
-                    result['ssrd_jm2'] = 0.0
-                
-                result['climate_source'] = 'ERA5_LAND'
+                    self.logger.warning("   ⚠️ Temperature is None")
+                if result['td2m_c'] is not None:
+                    self.logger.debug("   ✅ Dewpoint: %.2f°C", result['td2m_c'])
+                else:
+                    self.logger.warning("   ⚠️ Dewpoint is None")
+                if result['rh_pct'] is not None:
+                    self.logger.debug("   ✅ Humidity: %.1f%%", result['rh_pct'])
+                else:
+                    self.logger.warning("   ⚠️ Cannot calculate humidity")
+                self.logger.debug("   ✅ Precipitation: %sm", result['tp_m'])
+                self.logger.debug("   ✅ Solar: %s J/m²", result['ssrd_jm2'])
                 
             else:
-                self.logger.warning(f"⚠️ No ERA5 data for {year}-{month:02d}")
-                result['t2m_c'] = None
-                result['td2m_c'] = None
-                result['rh_pct'] = None
-                result['tp_m'] = None
-                result['ssrd_jm2'] = None
-                result['climate_source'] = None
+                self.logger.warning("⚠️ No ERA5 data for %d-%02d", year, month)
+                result.update(self._split_era5_values(None))
             
             # ========================================================
             # 4. LAND COVER
             # ========================================================
-            self.logger.debug(f"🗺️ Fetching land cover...")
-            
-            lc_result = self.land_cover.reduceRegion(
-                reducer=ee.Reducer.mode(),
-                geometry=point,
-                scale=Config.SCALE_METERS,
-                bestEffort=True,
-                maxPixels=1e9
-            ).getInfo()
+            self.logger.debug("🗺️ Fetching land cover...")
             
-            lc_value = lc_result.get('Map')
+            with METRICS.timer('collect.land_cover'):
+                lc_value = self.static_layers.get('land_cover', latitude, longitude)
             result['lc_type1'] = int(lc_value) if lc_value else None
             result['lc_source'] = 'ESA/WorldCover' if lc_value else None
             
@@ -977,9 +2260,9 @@ class IntegratedDataCollector:
             
             # Log summary with temporal info
             self.logger.info(
-                f"✅ TEMPORAL data collected for {year}-{month:02d} - "
-                f"Soil Version: {result.get('soil_version_year', 'N/A')} | "
-                f"Quality: {result['data_quality_score']:.1f}%"
+                "✅ TEMPORAL data collected for %d-%02d - Soil Version: %s | Quality: %.1f%%",
+                year, month, result.get('soil_version_year', 'N/A'), result['data_quality_score'],
+                extra=task_log(latitude, longitude, year, month)
             )
             
             return result
@@ -990,6 +2273,322 @@ class IntegratedDataCollector:
             self.logger.error(traceback.format_exc())
             return None
     
+    def get_monthly_data_batch(
+        self,
+        locations: List[Dict],
+        year: int,
+        month: int
+    ) -> Dict[str, Optional[Dict]]:
+        """
+        Collect one month of data for many locations at once
+        
+        All locations share the same filterDate window, so NDVI, ERA5 and land
+        cover are reduced over a single FeatureCollection with reduceRegions
+        and fetched in one getInfo() call. Returns one result dict per location
+        name (None if that location failed).
+        """
+        results = {location['name']: None for location in locations}
+        
+        try:
+            start_date = ee.Date.fromYMD(year, month, 1)
+            end_date = start_date.advance(1, 'month')
+            
+            points = ee.FeatureCollection([
+                ee.Feature(ee.Geometry.Point([loc['lon'], loc['lat']]), {'name': loc['name']})
+                for loc in locations
+            ])
+            buffered_points = points.map(lambda f: f.buffer(10000))  # 10km buffer for climate data
+            
+            # ========================================================
+            # 1. IMAGES FOR THE MONTH (shared by all locations)
+            # ========================================================
+            ndvi_primary = self.ndvi_collection.filterDate(start_date, end_date)
+            ndvi_extended = self.ndvi_collection.filterDate(start_date.advance(-2, 'month'), end_date)
+            has_primary = ndvi_primary.size().gt(0)
+            has_extended = ndvi_extended.size().gt(0)
+            
+            era5_filtered = self.era5_collection.filterDate(start_date, end_date)
+            has_era5 = era5_filtered.size().gt(0)
+            
+            def reduce_ndvi(collection):
+                return collection.mean().multiply(0.0001).reduceRegions(
+                    collection=points,
+                    reducer=ee.Reducer.mean().setOutputs(['NDVI']),
+                    scale=Config.SCALE_METERS
+                )
+            
+            no_features = ee.FeatureCollection([])
+            
+            # ========================================================
+            # 2. ONE reduceRegions PER LAYER, ONE getInfo FOR ALL
+            # ========================================================
+            # Window choice happens server-side - no size() probes
+            lc_values = self.static_layers.get_many('land_cover', locations)
+            reductions = {
+                'ndvi': ee.Algorithms.If(
+                    has_primary,
+                    reduce_ndvi(ndvi_primary),
+                    ee.Algorithms.If(has_extended, reduce_ndvi(ndvi_extended), no_features)
+                ),
+                'ndvi_source': ee.Algorithms.If(
+                    has_primary,
+                    'MODIS/MOD13A2',
+                    ee.Algorithms.If(has_extended, 'MODIS/MOD13A2_extended', None)
+                ),
+                'era5': ee.Algorithms.If(
+                    has_era5,
+                    self._era5_monthly_image(era5_filtered).reduceRegions(
+                        collection=buffered_points,
+                        reducer=ee.Reducer.mean(),
+                        scale=Config.ERA5_SCALE
+                    ),
+                    no_features
+                ),
+                'has_era5': has_era5
+            }
+            
+            values = self._get_info(ee.Dictionary(reductions), f"Batch {year}-{month:02d}", stage='ee.batch')
+            ndvi_source = values.get('ndvi_source')
+            has_era5 = bool(values.get('has_era5'))
+            
+            by_name = {
+                layer: {
+                    feature['properties']['name']: feature['properties']
+                    for feature in values[layer]['features']
+                }
+                for layer in ('ndvi', 'era5')
+            }
+            
+        except Exception as e:
+            self.logger.error(f"❌ Failed to get batched data for {year}-{month:02d}: {e}")
+            return results
+        
+        # ========================================================
+        # 3. SPLIT INTO ONE RESULT PER LOCATION
+        # ========================================================
+        for location in locations:
+            name = location['name']
+            try:
+                result = {}
+                self._add_soil_data(result, location['lat'], location['lon'], year, month)
+                
+                ndvi_value = by_name.get('ndvi', {}).get(name, {}).get('NDVI')
+                result['ndvi'] = ndvi_value
+                result['ndvi_source'] = ndvi_source if ndvi_value is not None else None
+                
+                if has_era5:
+                    result.update(self._split_era5_values(by_name['era5'].get(name, {})))
+                else:
+                    result.update(self._split_era5_values(None))
+                
+                lc_value = lc_values.get(name)
+                result['lc_type1'] = int(lc_value) if lc_value else None
+                result['lc_source'] = 'ESA/WorldCover' if lc_value else None
+                
+                result['data_quality_score'] = self._calculate_quality_score(result)
+                results[name] = result
+                
+            except Exception as e:
+                self.logger.error(f"❌ Failed to assemble batched data for {name}: {e}")
+        
+        self.logger.info(
+            f"✅ BATCHED data collected for {year}-{month:02d} - "
+            f"{sum(r is not None for r in results.values())}/{len(locations)} locations"
+        )
+        
+        return results
+    
+    def get_series_data(
+        self,
+        latitude: float,
+        longitude: float,
+        months: List[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], Optional[Dict]]:
+        """
+        Collect many months for one location with a server-side map
+        
+        The monthly NDVI/ERA5 composites are built by mapping over the month
+        start dates, so each chunk of Config.SERIES_CHUNK_MONTHS months is a
+        single getInfo(). Returns one result dict per (year, month).
+        """
+        results = {ym: None for ym in months}
+        
+        point = ee.Geometry.Point([longitude, latitude])
+        buffer_point = point.buffer(10000)  # 10km buffer for climate data
+        
+        def monthly_feature(start):
+            start_date = ee.Date(start)
+            end_date = start_date.advance(1, 'month')
+            
+            era5_filtered = self.era5_collection.filterDate(start_date, end_date).filterBounds(point)
+            has_era5, era5_values = self._era5_expression(era5_filtered, buffer_point)
+            
+            properties = self._ndvi_expression(point, start_date, end_date) \
+                .combine(era5_values) \
+                .set('has_era5', has_era5) \
+                .set('year', start_date.get('year')) \
+                .set('month', start_date.get('month'))
+            return ee.Feature(None, properties)
+        
+        try:
+            # Land cover is static - one value for the whole series
+            lc_value = self.static_layers.get('land_cover', latitude, longitude)
+        except Exception as e:
+            self.logger.error(f"❌ Land cover fetch failed: {e}")
+            lc_value = None
+        
+        for i in range(0, len(months), Config.SERIES_CHUNK_MONTHS):
+            chunk = months[i:i + Config.SERIES_CHUNK_MONTHS]
+            label = f"Series {chunk[0][0]}-{chunk[0][1]:02d}..{chunk[-1][0]}-{chunk[-1][1]:02d}"
+            
+            try:
+                start_dates = ee.List([ee.Date.fromYMD(year, month, 1) for year, month in chunk])
+                table = ee.FeatureCollection(start_dates.map(monthly_feature))
+                features = self._get_info(table, label, stage='ee.series')['features']
+            except Exception as e:
+                self.logger.error(f"❌ {label} failed: {e}")
+                continue
+            
+            for feature in features:
+                props = feature['properties']
+                year, month = int(props['year']), int(props['month'])
+                
+                try:
+                    result = {}
+                    self._add_soil_data(result, latitude, longitude, year, month)
+                    
+                    result['ndvi'] = props.get('ndvi')
+                    result['ndvi_source'] = props.get('ndvi_source')
+                    
+                    result.update(self._split_era5_values(props if props.get('has_era5') else None))
+                    
+                    result['lc_type1'] = int(lc_value) if lc_value else None
+                    result['lc_source'] = 'ESA/WorldCover' if lc_value else None
+                    
+                    result['data_quality_score'] = self._calculate_quality_score(result)
+                    results[(year, month)] = result
+                    
+                except Exception as e:
+                    self.logger.error(f"❌ Failed to assemble series data for {year}-{month:02d}: {e}")
+            
+            self.logger.info(f"✅ {label}: {len(features)} months collected")
+        
+        return results
+    
+    def _ndvi_expression(self, point: ee.Geometry, start_date: ee.Date, end_date: ee.Date) -> ee.Dictionary:
+        """
+        Server-side NDVI for a month: {'ndvi', 'ndvi_source'}
+        
+        Falls back to a 2-month extended lookback when the month has no
+        images, choosing the window with ee.Algorithms.If instead of probing.
+        """
+        def reduce_window(collection, source):
+            ndvi_value = collection.mean().multiply(0.0001).reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=point,
+                scale=Config.SCALE_METERS,
+                bestEffort=True,
+                maxPixels=1e9
+            ).get('NDVI')
+            return ee.Dictionary({'ndvi': ndvi_value, 'ndvi_source': source})
+        
+        primary = self.ndvi_collection.filterDate(start_date, end_date).filterBounds(point)
+        extended = self.ndvi_collection.filterDate(start_date.advance(-2, 'month'), end_date).filterBounds(point)
+        
+        return ee.Dictionary(ee.Algorithms.If(
+            primary.size().gt(0),
+            reduce_window(primary, 'MODIS/MOD13A2'),
+            ee.Algorithms.If(
+                extended.size().gt(0),
+                reduce_window(extended, 'MODIS/MOD13A2_extended'),
+                ee.Dictionary({'ndvi': None, 'ndvi_source': None})
+            )
+        ))
+    
+    def _era5_expression(self, era5_filtered: ee.ImageCollection, geometry: ee.Geometry) -> Tuple:
+        """
+        Server-side ERA5 monthly values: (has_era5, ee.Dictionary of band means)
+        
+        The dictionary is empty when the month has no images, chosen with
+        ee.Algorithms.If instead of probing the collection size.
+        """
+        has_era5 = era5_filtered.size().gt(0)
+        era5_values = ee.Dictionary(ee.Algorithms.If(
+            has_era5,
+            self._era5_monthly_image(era5_filtered).reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=geometry,
+                scale=Config.ERA5_SCALE,
+                bestEffort=True,
+                maxPixels=1e9
+            ),
+            ee.Dictionary()
+        ))
+        return has_era5, era5_values
+    
+    def _add_soil_data(self, result: Dict, latitude: float, longitude: float, year: int, month: int):
+        """Add temporal soil properties (including NPK) to a result dict"""
+        self.logger.debug("🌱 Fetching TEMPORAL soil data for %d...", year)
+        
+        # Cache lookups included - 'ee.soil' holds the remote part alone
+        with METRICS.timer('collect.soil'):
+            soil_data = self.soil_handler.get_soil_data_for_date(
+                latitude=latitude,
+                longitude=longitude,
+                year=year,
+                month=month
+            )
+        
+        # Add soil properties INCLUDING NPK
+        for prop in ['sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec', 'nitrogen', 'phosphorus', 'potassium']:
+            result[prop] = soil_data.get(prop)
+        
+        # Add temporal metadata
+        result['soil_version_year'] = soil_data['_metadata']['soilgrids_release_used']  # CORRECTED
+        result['soil_data_year'] = soil_data['_metadata']['data_represented_year']  # CORRECTED
+    
+    @staticmethod
+    def _era5_monthly_image(era5_filtered: ee.ImageCollection) -> ee.Image:
+        """Monthly ERA5 composite: mean temperatures, summed precipitation and radiation"""
+        means = era5_filtered.select(['temperature_2m', 'dewpoint_temperature_2m']).mean()
+        sums = era5_filtered.select(['total_precipitation', 'surface_solar_radiation_downwards']).sum()
+        return means.addBands(sums)
+    
+    def _split_era5_values(self, era5_values: Optional[Dict]) -> Dict:
+        """
+        Convert reduced ERA5 band values into result fields
+        
+        Keeps the per-variable fallbacks: temperatures default to None,
+        precipitation and radiation to 0.0. A None input means no ERA5 images.
+        """
+        if era5_values is None:
+            return {
+                't2m_c': None, 'td2m_c': None, 'rh_pct': None,
+                'tp_m': None, 'ssrd_jm2': None, 'climate_source': None
+            }
+        
+        climate = {}
+        
+        t2m_value = era5_values.get('temperature_2m')
+        climate['t2m_c'] = t2m_value - 273.15 if t2m_value is not None else None
+        
+        td2m_value = era5_values.get('dewpoint_temperature_2m')
+        climate['td2m_c'] = td2m_value - 273.15 if td2m_value is not None else None
+        
+        if climate['t2m_c'] is not None and climate['td2m_c'] is not None:
+            climate['rh_pct'] = self._compute_rh(climate['t2m_c'], climate['td2m_c'])
+        else:
+            climate['rh_pct'] = None
+        
+        tp_value = era5_values.get('total_precipitation')
+        climate['tp_m'] = tp_value if tp_value is not None else 0.0
+        
+        ssrd_value = era5_values.get('surface_solar_radiation_downwards')
+        climate['ssrd_jm2'] = ssrd_value if ssrd_value is not None else 0.0
+        
+        climate['climate_source'] = 'ERA5_LAND'
+        return climate
+    
     @staticmethod
     def _compute_rh(t_celsius: float, td_celsius: float) -> float:
         """Calculate relative humidity from temperature and dewpoint"""
@@ -1018,46 +2617,150 @@ class IntegratedDataCollector:
 # ==================== CHECKPOINT MANAGER ====================
 
 class CheckpointManager:
-    """Manages pipeline checkpoints"""
+    """
+    Manages pipeline checkpoints
+    
+    Completed and failed tasks are kept in memory as a set/dict (O(1) checks)
+    and each update is appended to a journal file. The journal is compacted
+    into an atomically written JSON snapshot every
+    Config.CHECKPOINT_COMPACT_EVERY entries and on save_checkpoint().
+    """
     
     def __init__(self, checkpoint_file: str = Config.CHECKPOINT_FILE):
         self.checkpoint_file = Path(checkpoint_file)
+        self.journal_file = self.checkpoint_file.with_suffix('.journal')
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.checkpoint_data = self._load_checkpoint()
+        self._lock = threading.RLock()
+        
+        self.completed = set()
+        self.failed = {}
+        self.last_update = None
+        self._load_checkpoint()
+        
+        # Terminate a torn last line first, so appends never merge into it
+        # even if the fold below fails
+        self._terminate_journal()
+        self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        self._journal_entries = 0
+        
+        # Fold a leftover journal into a fresh snapshot
+        if self.journal_file.stat().st_size > 0:
+            self.save_checkpoint()
+    
+    def _terminate_journal(self):
+        """Append a newline if the journal ends mid-line (crash during a write)"""
+        if not self.journal_file.exists() or self.journal_file.stat().st_size == 0:
+            return
+        with open(self.journal_file, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
     
-    def _load_checkpoint(self) -> Dict:
-        """Load checkpoint"""
+    @staticmethod
+    def _task_id(location: str, year: int, month: int) -> str:
+        return f"{location}_{year}_{month:02d}"
+    
+    def _load_checkpoint(self):
+        """Load snapshot, then replay the journal on top of it"""
         if self.checkpoint_file.exists():
             try:
                 with open(self.checkpoint_file, 'r') as f:
                     data = json.load(f)
-                self.logger.info(f"📋 Loaded checkpoint: {len(data.get('completed', []))} completed")
-                return data
+                self.completed = set(data.get('completed', []))
+                failed = data.get('failed', {})
+                # Older checkpoints stored failed tasks as a plain list
+                self.failed = {task_id: {} for task_id in failed} if isinstance(failed, list) else failed
+                self.last_update = data.get('last_update')
             except Exception as e:
                 self.logger.warning(f"⚠️ Failed to load checkpoint: {e}")
         
-        return {'completed': [], 'failed': [], 'last_update': None}
+        replayed = 0
+        if self.journal_file.exists():
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Partially written last line after a crash
+                        continue
+                    self._apply(entry)
+                    replayed += 1
+        
+        self.logger.info(
+            f"📋 Loaded checkpoint: {len(self.completed)} completed, "
+            f"{len(self.failed)} failed ({replayed} journal entries)"
+        )
+    
+    def _apply(self, entry: Dict):
+        """Apply a journal entry to the in-memory index"""
+        task_id = entry['task']
+        if entry['status'] == 'completed':
+            self.completed.add(task_id)
+            self.failed.pop(task_id, None)
+        elif entry['status'] == 'failed':
+            self.failed[task_id] = {'error': entry.get('error'), 'time': entry.get('time')}
+        self.last_update = entry.get('time')
+    
+    def _append(self, entry: Dict):
+        """Apply an entry and append it to the journal"""
+        with self._lock:
+            self._apply(entry)
+            try:
+                with METRICS.timer('checkpoint.journal') as sample:
+                    line = json.dumps(entry) + "\n"
+                    sample['bytes'] = len(line)
+                    self._journal.write(line)
+                    self._journal.flush()
+                self._journal_entries += 1
+            except Exception as e:
+                self.logger.error(f"❌ Failed to write checkpoint journal: {e}")
+            
+            if self._journal_entries >= Config.CHECKPOINT_COMPACT_EVERY:
+                self.save_checkpoint()
     
     def save_checkpoint(self):
-        """Save checkpoint"""
+        """Write an atomic snapshot and truncate the journal"""
         try:
-            self.checkpoint_data['last_update'] = datetime.now().isoformat()
-            with open(self.checkpoint_file, 'w') as f:
-                json.dump(self.checkpoint_data, f, indent=2)
+            with METRICS.timer('checkpoint.snapshot'), self._lock:
+                snapshot = {
+                    'completed': sorted(self.completed),
+                    'failed': self.failed,
+                    'last_update': datetime.now().isoformat()
+                }
+                
+                tmp_file = self.checkpoint_file.with_suffix('.tmp')
+                with open(tmp_file, 'w') as f:
+                    json.dump(snapshot, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.checkpoint_file)
+                
+                # Snapshot now holds everything - start a fresh journal
+                self._journal.close()
+                self._journal = open(self.journal_file, 'w', encoding='utf-8')
+                self._journal_entries = 0
         except Exception as e:
             self.logger.error(f"❌ Failed to save checkpoint: {e}")
     
     def mark_completed(self, location: str, year: int, month: int):
         """Mark task as completed"""
-        task_id = f"{location}_{year}_{month:02d}"
-        if task_id not in self.checkpoint_data['completed']:
-            self.checkpoint_data['completed'].append(task_id)
-            self.save_checkpoint()
+        task_id = self._task_id(location, year, month)
+        if task_id not in self.completed:
+            self._append({'status': 'completed', 'task': task_id, 'time': datetime.now().isoformat()})
+    
+    def mark_failed(self, location: str, year: int, month: int, error: str = None):
+        """Record a failed task (cleared once it completes)"""
+        task_id = self._task_id(location, year, month)
+        self._append({
+            'status': 'failed',
+            'task': task_id,
+            'error': error,
+            'time': datetime.now().isoformat()
+        })
     
     def is_completed(self, location: str, year: int, month: int) -> bool:
         """Check if task is completed"""
-        task_id = f"{location}_{year}_{month:02d}"
-        return task_id in self.checkpoint_data['completed']
+        return self._task_id(location, year, month) in self.completed
 
 
 # ==================== MAIN PIPELINE ====================
@@ -1080,18 +2783,39 @@ class HistoricalDataPipeline:
             'start_time': None,
             'end_time': None
         }
+        
+        # Shared by worker threads
+        self._lock = threading.Lock()
+        self._batch_data = []
+        self._batch_started_at = None
+        
+        # (location_name, year, month) already in the database
+        self._keys_lock = threading.Lock()
+        self._existing_keys = set()
+        self._existing_keys_loaded_at = None
+        
+        # Per-task mode: months left per location (profiling stage per finished location)
+        self._tasks_left = {}
+        
+        # Progress lines stand in for sampled/dropped per-task lines
+        self._progress_logged_at = time.monotonic()
     
     def run(self, resume: bool = True):
         """Run the complete pipeline"""
         self.stats['start_time'] = datetime.now()
+        METRICS.reset()
         
         self.logger.info("="*80)
         self.logger.info("🚀 INTEGRATED HISTORICAL DATA PIPELINE (2014-2024) - TEMPORAL SOIL DATA")
         self.logger.info("="*80)
         self.logger.info(f"📅 Time Range: {Config.START_YEAR} - {Config.END_YEAR}")
         self.logger.info(f"📍 Locations: {len(Config.LOCATIONS)}")
-        self.logger.info(f"💾 Database: {Config.DB_NAME}")
+        self.logger.info(f"💾 Database: {self.db.backend.name} ({Config.DB_NAME if self.db.backend.name == 'mssql' else Config.SQLITE_PATH})")
         self.logger.info(f"🔄 Resume Mode: {resume}")
+        self.logger.info(f"🧩 Extraction Mode: {Config.EXTRACTION_MODE}")
+        self.logger.info(f"✍️  Write Mode: {Config.WRITE_MODE}")
+        self.logger.info(f"🧵 Workers: {Config.MAX_WORKERS}")
+        self.logger.info(f"📝 Task Logging: {Config.TASK_LOG_MODE}{' (async)' if Config.LOG_ASYNC else ''}")
         self.logger.info("🌱 FEATURE: Temporal soil data with version-aware collection")
         self.logger.info("="*80)
         
@@ -1100,51 +2824,223 @@ class HistoricalDataPipeline:
         self.stats['total_tasks'] = len(Config.LOCATIONS) * total_months
         
         try:
-            # Process each location
-            for location in Config.LOCATIONS:
-                self._process_location(location, resume)
+            self._run_scheduler(self._build_tasks(resume))
+            
+            # Insert remaining batch
+            self._flush_batch()
+            self.checkpoint.save_checkpoint()
             
             self.stats['end_time'] = datetime.now()
             self._print_summary()
+            self._write_metrics()
             
         except KeyboardInterrupt:
             self.logger.warning("\n⚠️ Pipeline interrupted by user")
+            self._flush_batch()
             self.checkpoint.save_checkpoint()
             self._print_summary()
+            self._write_metrics()
         except Exception as e:
             self.logger.error(f"❌ Pipeline failed: {e}", exc_info=True)
             raise
     
-    def _process_location(self, location: Dict, resume: bool):
-        """Process all years/months for a single location"""
-        loc_name = location['name']
+    # ==================== SCHEDULER ====================
+    
+    def _build_tasks(self, resume: bool) -> List[Tuple[Callable, tuple]]:
+        """Build the task list for the configured extraction mode"""
+        years = range(Config.START_YEAR, Config.END_YEAR + 1)
         
-        self.logger.info(f"\n{'='*80}")
-        self.logger.info(f"📍 Processing: {loc_name} ({location['region']})")
-        self.logger.info(f"   Coordinates: ({location['lat']:.4f}, {location['lon']:.4f})")
-        self.logger.info(f"{'='*80}")
+        if Config.EXTRACTION_MODE == 'batched':
+            # All locations together, one task per month
+            return [
+                (self._process_month_batch, (year, month, resume))
+                for year in years for month in range(1, 13)
+            ]
         
-        batch_data = []
+        if Config.EXTRACTION_MODE == 'series':
+            # One whole-series task per location
+            return [
+                (self._process_location_series, (location, resume))
+                for location in Config.LOCATIONS
+            ]
         
-        # Iterate through years and months
-        for year in range(Config.START_YEAR, Config.END_YEAR + 1):
-            for month in range(1, 13):
-                
-                # Skip if already completed
-                if resume and self.checkpoint.is_completed(loc_name, year, month):
-                    self.stats['skipped'] += 1
-                    continue
-                
-                # Skip if already in database
-                if self.db.check_existing_data(loc_name, year, month):
-                    self.logger.debug(f"⏭️  Skipping {loc_name} {year}-{month:02d} (in DB)")
-                    self.checkpoint.mark_completed(loc_name, year, month)
-                    self.stats['skipped'] += 1
-                    continue
-                
-                try:
+        # One task per (location, year, month)
+        self._tasks_left = {location['name']: len(years) * 12 for location in Config.LOCATIONS}
+        return [
+            (self._process_task, (location, year, month, resume))
+            for location in Config.LOCATIONS for year in years for month in range(1, 13)
+        ]
+    
+    def _run_scheduler(self, tasks: List[Tuple[Callable, tuple]]):
+        """Run tasks on a thread pool capped at Config.MAX_WORKERS"""
+        if Config.MAX_WORKERS <= 1:
+            for func, args in tasks:
+                self._run_task(func, args)
+                self._flush_if_stale()
+            return
+        
+        # Wake up regularly so rows buffered behind slow tasks still flush on age
+        tick = max(0.5, Config.BATCH_FLUSH_SECONDS / 4)
+        
+        executor = ThreadPoolExecutor(max_workers=Config.MAX_WORKERS, thread_name_prefix='worker')
+        try:
+            pending = {executor.submit(self._run_task, func, args) for func, args in tasks}
+            while pending:
+                done, pending = wait(pending, timeout=tick, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                self._flush_if_stale()
+        finally:
+            # On interrupt, drop queued tasks and let running ones finish
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _run_task(self, func: Callable, args: tuple):
+        """Run one task; an unexpected error is recorded as a failure instead of aborting the run"""
+        try:
+            func(*args)
+        except Exception as e:
+            # Last argument is the resume flag; locations are shown by name
+            label = ", ".join(str(arg['name']) if isinstance(arg, dict) else str(arg) for arg in args[:-1])
+            self.logger.error(f"❌ Task {func.__name__}({label}) crashed: {e}", exc_info=True)
+            self._count('failed')
+    
+    def _count(self, key: str, amount: int = 1):
+        """Thread-safe statistics update (plus a periodic progress line unless every task is logged)"""
+        with self._lock:
+            self.stats[key] += amount
+            
+            now = time.monotonic()
+            if Config.TASK_LOG_MODE == 'all' or now - self._progress_logged_at < Config.PROGRESS_LOG_SECONDS:
+                return
+            self._progress_logged_at = now
+            
+            stats = dict(self.stats)
+        
+        done = stats['completed'] + stats['failed'] + stats['skipped']
+        percent = done / stats['total_tasks'] * 100 if stats['total_tasks'] else 0.0
+        elapsed = (datetime.now() - stats['start_time']).total_seconds() if stats['start_time'] else 0.0
+        rate = (stats['completed'] + stats['failed']) / elapsed if elapsed > 0 else 0.0
+        self.logger.info(
+            "📈 Progress: %d/%d tasks (%.1f%%) - ✅ %d | ⏭️  %d | ❌ %d | %.2f tasks/s",
+            done, stats['total_tasks'], percent, stats['completed'], stats['skipped'], stats['failed'], rate
+        )
+    
+    def _should_skip(self, loc_name: str, year: int, month: int, resume: bool) -> bool:
+        """Check checkpoint and database for an already collected month"""
+        # Skip if already completed
+        if resume and self.checkpoint.is_completed(loc_name, year, month):
+            self._count('skipped')
+            return True
+        
+        # Skip if already in database (upsert mode refreshes instead)
+        if Config.WRITE_MODE != 'upsert' and self._in_database(loc_name, year, month):
+            self.logger.debug("⏭️  Skipping %s %d-%02d (in DB)", loc_name, year, month)
+            self.checkpoint.mark_completed(loc_name, year, month)
+            self._count('skipped')
+            return True
+        
+        return False
+    
+    def _in_database(self, loc_name: str, year: int, month: int) -> bool:
+        """
+        Check the pre-fetched key set instead of querying per month
+        
+        The set is reloaded in one query every
+        Config.EXISTING_KEYS_REFRESH_SECONDS, so rows written by other
+        processes during the run are picked up.
+        """
+        with self._keys_lock:
+            loaded_at = self._existing_keys_loaded_at
+            if loaded_at is None or time.monotonic() - loaded_at > Config.EXISTING_KEYS_REFRESH_SECONDS:
+                # Other workers wait here instead of reading a half-loaded set
+                self._existing_keys = self.db.get_existing_keys(Config.START_YEAR, Config.END_YEAR)
+                self._existing_keys_loaded_at = time.monotonic()
+            
+            return (loc_name, year, month) in self._existing_keys
+    
+    def _add_row(self, data: Dict, location: Dict, year: int, month: int):
+        """Attach location metadata and queue the row for insertion"""
+        data['location_name'] = location['name']
+        data['latitude'] = location['lat']
+        data['longitude'] = location['lon']
+        data['year'] = year
+        data['month'] = month
+        
+        with self._lock:
+            if not self._batch_data:
+                self._batch_started_at = time.monotonic()
+            self._batch_data.append(data)
+            
+            # Flush by row count, or by age so durability stays bounded
+            if not self._batch_due():
+                return
+            rows, self._batch_data = self._batch_data, []
+        
+        # Insert batch if size reached (outside the lock)
+        self._flush_batch(rows)
+    
+    def _batch_due(self) -> bool:
+        """Whether the buffer is full or its oldest row is too old (caller holds _lock)"""
+        if not self._batch_data:
+            return False
+        return (
+            len(self._batch_data) >= Config.BATCH_SIZE or
+            time.monotonic() - self._batch_started_at >= Config.BATCH_FLUSH_SECONDS
+        )
+    
+    def _flush_if_stale(self):
+        """Flush on age between tasks, when no new row arrives to trigger it"""
+        with self._lock:
+            if not self._batch_due():
+                return
+            rows, self._batch_data = self._batch_data, []
+        
+        self._flush_batch(rows)
+    
+    def _flush_batch(self, rows: Optional[List[Dict]] = None):
+        """
+        Insert queued rows and only then mark them completed
+        
+        A failed insert leaves its months unmarked so the next run retries them.
+        """
+        if rows is None:
+            with self._lock:
+                rows, self._batch_data = self._batch_data, []
+        
+        if not rows:
+            return
+        
+        try:
+            self._insert_batch(rows)
+        except Exception as e:
+            for row in rows:
+                self.checkpoint.mark_failed(row['location_name'], row['year'], row['month'], f"Insert failed: {e}")
+            self._count('failed', len(rows))
+            return
+        
+        with self._keys_lock:
+            self._existing_keys.update((row['location_name'], row['year'], row['month']) for row in rows)
+        for row in rows:
+            self.checkpoint.mark_completed(row['location_name'], row['year'], row['month'])
+        self._count('completed', len(rows))
+    
+    # ==================== TASKS ====================
+    
+    def _process_task(self, location: Dict, year: int, month: int, resume: bool):
+        """Collect a single (location, year, month)"""
+        loc_name = location['name']
+        
+        with METRICS.location(loc_name):
+            if self._should_skip(loc_name, year, month, resume):
+                self._location_task_done(loc_name)
+                return
+            
+            task_extra = task_log(location['lat'], location['lon'], year, month)
+            
+            try:
+                with METRICS.timer('task.location_month'):
                     # Collect data
-                    self.logger.info(f"🔄 {loc_name} - {year}-{month:02d}")
+                    self.logger.info("🔄 %s - %d-%02d", loc_name, year, month, extra=task_extra)
                     
                     data = self.collector.get_monthly_data(
                         latitude=location['lat'],
@@ -1156,36 +3052,93 @@ class HistoricalDataPipeline:
                     if data is None:
                         raise ValueError("No data returned")
                     
-                    # Add metadata
-                    data['location_name'] = loc_name
-                    data['latitude'] = location['lat']
-                    data['longitude'] = location['lon']
-                    data['year'] = year
-                    data['month'] = month
-                    
-                    batch_data.append(data)
-                    
-                    self.logger.info(f"✅ Quality: {data['data_quality_score']:.1f}%")
-                    
-                    # Insert batch if size reached
-                    if len(batch_data) >= Config.BATCH_SIZE:
-                        self._insert_batch(batch_data)
-                        batch_data = []
-                    
-                    self.checkpoint.mark_completed(loc_name, year, month)
-                    self.stats['completed'] += 1
-                    
-                    # Rate limiting
-                    time.sleep(2)  # Increased to reduce server load
+                    self.logger.info(
+                        "✅ %s %d-%02d Quality: %.1f%%", loc_name, year, month, data['data_quality_score'],
+                        extra=task_extra
+                    )
                     
-                except Exception as e:
-                    self.logger.error(f"❌ Failed: {loc_name} {year}-{month:02d} - {e}")
-                    self.stats['failed'] += 1
-                    continue
+                    self._add_row(data, location, year, month)
+                
+            except Exception as e:
+                self.logger.error(f"❌ Failed: {loc_name} {year}-{month:02d} - {e}")
+                self.checkpoint.mark_failed(loc_name, year, month, str(e))
+                self._count('failed')
         
-        # Insert remaining batch
-        if batch_data:
-            self._insert_batch(batch_data)
+        self._location_task_done(loc_name)
+    
+    def _location_task_done(self, loc_name: str):
+        """Count down a location's months; its last one marks a profiling stage"""
+        with self._lock:
+            self._tasks_left[loc_name] = self._tasks_left.get(loc_name, 1) - 1
+            finished = self._tasks_left[loc_name] == 0
+        
+        if finished:
+            profiling.mark_stage(f"location {loc_name}")
+    
+    def _process_location_series(self, location: Dict, resume: bool):
+        """Process all pending years/months for a location in series mode"""
+        loc_name = location['name']
+        
+        self.logger.info(f"\n{'='*80}")
+        self.logger.info(f"📍 Processing: {loc_name} ({location['region']}) - series mode")
+        self.logger.info(f"   Coordinates: ({location['lat']:.4f}, {location['lon']:.4f})")
+        self.logger.info(f"{'='*80}")
+        
+        with METRICS.location(loc_name):
+            pending = [
+                (year, month)
+                for year in range(Config.START_YEAR, Config.END_YEAR + 1)
+                for month in range(1, 13)
+                if not self._should_skip(loc_name, year, month, resume)
+            ]
+            
+            if not pending:
+                return
+            
+            with METRICS.timer('task.location_series'):
+                results = self.collector.get_series_data(location['lat'], location['lon'], pending)
+        
+        for year, month in pending:
+            data = results.get((year, month))
+            
+            if data is None:
+                self.logger.error(f"❌ Failed: {loc_name} {year}-{month:02d} - No data returned")
+                self.checkpoint.mark_failed(loc_name, year, month, "No data returned")
+                self._count('failed')
+                continue
+            
+            self._add_row(data, location, year, month)
+        
+        profiling.mark_stage(f"location {loc_name}")
+    
+    def _process_month_batch(self, year: int, month: int, resume: bool):
+        """Process one month for all locations with a single batched extraction"""
+        pending = [
+            location for location in Config.LOCATIONS
+            if not self._should_skip(location['name'], year, month, resume)
+        ]
+        
+        if not pending:
+            return
+        
+        self.logger.info(f"🔄 {year}-{month:02d} - {len(pending)} locations (batched)")
+        
+        with METRICS.timer('task.month_batch'):
+            results = self.collector.get_monthly_data_batch(pending, year, month)
+        
+        for location in pending:
+            data = results.get(location['name'])
+            
+            if data is None:
+                self.logger.error(f"❌ Failed: {location['name']} {year}-{month:02d} - No data returned")
+                self.checkpoint.mark_failed(location['name'], year, month, "No data returned")
+                self._count('failed')
+                continue
+            
+            self._add_row(data, location, year, month)
+        
+        # Batched mode has no per-location boundary - one stage per month
+        profiling.mark_stage(f"month {year}-{month:02d}")
     
     def _insert_batch(self, batch_data: List[Dict]):
         """Insert batch into database"""
@@ -1208,7 +3161,10 @@ class HistoricalDataPipeline:
             df = df[available_columns]
             
             # Insert to database
-            self.db.bulk_insert(df, 'historical_data', if_exists='append')
+            if Config.WRITE_MODE == 'upsert':
+                self.db.upsert(df, 'historical_data')
+            else:
+                self.db.bulk_insert(df, 'historical_data', if_exists='append')
             
             self.logger.info(f"💾 Batch inserted: {len(df)} records with temporal soil data")
             
@@ -1238,8 +3194,58 @@ class HistoricalDataPipeline:
         
         success_rate = (self.stats['completed'] / self.stats['total_tasks'] * 100) if self.stats['total_tasks'] > 0 else 0
         self.logger.info(f"📈 Success Rate: {success_rate:.1f}%")
+        
+        if METRICS.enabled and METRICS.stages:
+            report = METRICS.report()
+            self.logger.info("-"*80)
+            self.logger.info(f"{'⏱️  Stage':<30} {'Calls':>8} {'Errors':>7} {'Total s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+            for stage, stats in report['stages'].items():
+                p50, p95, p99 = (
+                    stats[key] * 1000 if stats[key] is not None else float('nan')
+                    for key in ('p50_seconds', 'p95_seconds', 'p99_seconds')
+                )
+                self.logger.info(
+                    f"   {stage:<27} {stats['count']:>8} {stats['errors']:>7} "
+                    f"{stats['total_seconds']:>10.1f} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f}"
+                )
+            if report['counters'].get('ee.throttled'):
+                self.logger.info(f"🚦 EE throttled {report['counters']['ee.throttled']} times")
+        
+        if TASK_LOG_FILTER is not None and TASK_LOG_FILTER.suppressed:
+            self.logger.info(
+                f"🔇 Task log lines suppressed: {TASK_LOG_FILTER.suppressed} of {TASK_LOG_FILTER.seen} "
+                f"({Config.TASK_LOG_MODE})"
+            )
+        
         self.logger.info("🌱 FEATURE: Temporal soil data collection enabled")
         self.logger.info("="*80)
+    
+    def _write_metrics(self):
+        """Write the JSON run report (and the Prometheus text file, if configured)"""
+        if not METRICS.enabled:
+            return
+        
+        run_info = {
+            'extraction_mode': Config.EXTRACTION_MODE,
+            'write_mode': Config.WRITE_MODE,
+            'max_workers': Config.MAX_WORKERS,
+            'locations': len(Config.LOCATIONS),
+            'years': [Config.START_YEAR, Config.END_YEAR],
+            **self.stats
+        }
+        if self.stats['start_time'] and self.stats['end_time']:
+            run_info['duration_seconds'] = (self.stats['end_time'] - self.stats['start_time']).total_seconds()
+        
+        try:
+            timestamp = self.stats['start_time'].strftime("%Y%m%d_%H%M%S")
+            report_file = METRICS.write_json(Path(Config.METRICS_DIR) / f"metrics_{timestamp}.json", run_info)
+            self.logger.info(f"📊 Run metrics written to {report_file}")
+            
+            if Config.METRICS_PROMETHEUS_FILE:
+                prom_file = METRICS.write_prometheus(Config.METRICS_PROMETHEUS_FILE)
+                self.logger.info(f"📊 Prometheus metrics written to {prom_file}")
+        except Exception as e:
+            self.logger.error(f"❌ Failed to write run metrics: {e}")
 
 
 # ==================== ENTRY POINT ====================
@@ -1255,9 +3261,10 @@ def main():
     logger.info("="*80)
     
     try:
-        # Create and run pipeline
-        pipeline = HistoricalDataPipeline()
-        pipeline.run(resume=True)
+        # Create and run pipeline (profiled with --profile[=mode] or HISTORICAL_PROFILE)
+        with profiling.profile_run('main_pipeline', Config.LOG_DIR):
+            pipeline = HistoricalDataPipeline()
+            pipeline.run(resume=True)
         
         logger.info("\n✅ Temporal pipeline completed successfully!")
         logger.info("📊 Soil data now varies appropriately by year")
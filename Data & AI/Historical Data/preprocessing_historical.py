@@ -18,9 +18,12 @@ Scientific References:
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from typing import Dict, Tuple
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 import logging
 
+import profiling
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -63,19 +66,7 @@ class ScientificNPKEstimator:
         float
             Nitrogen in % (e.g., 0.317%)
         """
-        if soc is None or np.isnan(soc) or soc <= 0:
-            return 0.15  # default for Egyptian soils
-            
-        # ✅ Modification: SOC in g/kg → convert to % first
-        soc_percent = soc / 10.0  # g/kg → % (since 100 g/kg = 10%)
-        
-        # حساب النيتروجين
-        nitrogen = soc_percent / self.egyptian_params['n_cn_ratio']
-        
-        # التأكد من النطاق (0.05% - 0.5%)
-        nitrogen = max(0.05, min(0.5, nitrogen))
-        
-        return round(nitrogen, 3)
+        return float(self.estimate_nitrogen_array(_as_float_array(soc))[0])
     
     def estimate_phosphorus(
         self, 
@@ -110,59 +101,12 @@ class ScientificNPKEstimator:
         float
             Phosphorus in mg/kg
         """
-        if soc is None or np.isnan(soc) or soc <= 0:
-            return 12.0  # default
-            
-        # 1. ✅ Calculate Base P from SOC (convert SOC from g/kg to % first)
-        soc_g_kg = soc  # SOC in g/kg
-        soc_percent = soc_g_kg / 10.0  # g/kg → % (since 100 g/kg = 10%)
-        base_p = soc_percent * self.egyptian_params['p_base_factor']
-        
-        # 2. CEC Factor - ✅ CEC is now in cmol/kg (no conversion)
-        if not pd.isna(cec) and cec > 0:
-            cec_cmol = cec  # ✅ Already in cmol/kg
-            if cec_cmol > 20:
-                cec_factor = 1.0 - ((cec_cmol - 20) / 200)
-            else:
-                cec_factor = 1.0 + ((20 - cec_cmol) / 100)
-            cec_factor = max(0.7, min(1.3, cec_factor))
-        else:
-            cec_factor = 1.0
-            
-        # 3. Clay Factor
-        if not pd.isna(clay) and clay > 0:
-            clay_percent = clay  # ✅ Clay already in %
-            if clay_percent > 30:
-                clay_factor = 1.0 - ((clay_percent - 30) / 150)
-            else:
-                clay_factor = 1.0
-            clay_factor = max(0.6, min(1.2, clay_factor))
-        else:
-            clay_factor = 1.0
-            
-        # 4. pH Factor
-        if pd.isna(ph):
-            ph_factor = 1.0
-            ph_actual = 7.0
-        else:
-            ph_actual = ph  # ✅ pH already normalized
-                
-            if 6.0 <= ph_actual <= 7.5:
-                ph_factor = 1.25  # Maximum availability
-            elif ph_actual < 6.0:
-                ph_factor = 0.85 - ((6.0 - ph_actual) * 0.05)
-            else:
-                ph_factor = 1.0 - ((ph_actual - 7.5) * 0.08)
-            
-            ph_factor = max(0.5, min(1.25, ph_factor))
-        
-        # 5. Final Calculation
-        phosphorus = base_p * cec_factor * clay_factor * ph_factor
-        
-        # 6. Realistic Range (5-35 mg/kg)
-        phosphorus = max(5.0, min(35.0, phosphorus))
-        
-        return round(phosphorus, 1)
+        return float(self.estimate_phosphorus_array(
+            _as_float_array(soc),
+            _as_float_array(cec),
+            _as_float_array(clay),
+            _as_float_array(ph)
+        )[0])
     
     def estimate_potassium(
         self,
@@ -174,61 +118,199 @@ class ScientificNPKEstimator:
         """
         Estimate Exchangeable Potassium - Modified Egyptian Version
         """
-        if cec is None or np.isnan(cec) or cec <= 0:
-            return 200.0  # Average for Egyptian soils
+        return float(self.estimate_potassium_array(
+            _as_float_array(cec),
+            _as_float_array(clay),
+            _as_float_array(silt),
+            _as_float_array(soc)
+        )[0])
+    
+    # ==================== VECTORIZED ENGINE ====================
+    
+    def estimate_nitrogen_array(self, soc: np.ndarray, rounded: bool = True) -> np.ndarray:
+        """
+        Columnar version of estimate_nitrogen (SOC in g/kg → N in %)
+        
+        NaN or non-positive SOC gets the Egyptian default (0.15%).
+        rounded=False skips the final rounding (used by the SQL verification).
+        """
+        soc = np.asarray(soc, dtype=float)
+        valid = ~np.isnan(soc) & (soc > 0)
+        
+        # SOC in g/kg → % first, then divide by the C:N ratio
+        soc_percent = np.where(valid, soc, 0.0) / 10.0
+        nitrogen = soc_percent / self.egyptian_params['n_cn_ratio']
         
-        # 1. ✅ CEC is already in cmol/kg (no conversion)
-        cec_cmol = cec
+        # Range (0.05% - 0.5%)
+        nitrogen = np.clip(nitrogen, 0.05, 0.5)
+        if rounded:
+            nitrogen = _round_half_even(nitrogen, 3)
+        
+        return np.where(valid, nitrogen, 0.15)
+    
+    def estimate_phosphorus_array(
+        self,
+        soc: np.ndarray,
+        cec: np.ndarray,
+        clay: np.ndarray,
+        ph: np.ndarray,
+        rounded: bool = True
+    ) -> np.ndarray:
+        """
+        Columnar version of estimate_phosphorus (mg/kg)
+        
+        Each piecewise factor is computed as a masked operation; rows with
+        NaN or non-positive SOC get the default (12.0 mg/kg).
+        """
+        soc = np.asarray(soc, dtype=float)
+        cec = np.asarray(cec, dtype=float)
+        clay = np.asarray(clay, dtype=float)
+        ph = np.asarray(ph, dtype=float)
         
-        # 2. Modified Egyptian Formula
-        # In Egyptian soils, Potassium is usally 150-300 mg/kg
-        # CEC ranges between 10-30 cmol/kg
-        # Relation: K = CEC × 40 + 50 (Modified for Egyptian soils)
-        base_k = (cec_cmol * 40) + 50
+        valid = ~np.isnan(soc) & (soc > 0)
+        
+        # 1. Base P from SOC (g/kg → %)
+        soc_percent = soc / 10.0
+        base_p = soc_percent * self.egyptian_params['p_base_factor']
+        
+        # 2. CEC Factor (cmol/kg)
+        cec_factor = np.where(
+            cec > 20,
+            1.0 - ((cec - 20) / 200),
+            1.0 + ((20 - cec) / 100)
+        )
+        cec_factor = np.clip(cec_factor, 0.7, 1.3)
+        cec_factor = np.where(~np.isnan(cec) & (cec > 0), cec_factor, 1.0)
         
         # 3. Clay Factor
-        if not pd.isna(clay) and clay > 0:
-            if clay < 20:
-                clay_factor = 0.8
-            elif 20 <= clay <= 40:
-                clay_factor = 1.0 + ((clay - 30) / 100)
-            else:
-                clay_factor = 0.9
-            clay_factor = max(0.7, min(1.2, clay_factor))
-        else:
-            clay_factor = 1.0
+        clay_factor = np.where(clay > 30, 1.0 - ((clay - 30) / 150), 1.0)
+        clay_factor = np.clip(clay_factor, 0.6, 1.2)
+        clay_factor = np.where(~np.isnan(clay) & (clay > 0), clay_factor, 1.0)
+        
+        # 4. pH Factor
+        ph_factor = np.select(
+            [(ph >= 6.0) & (ph <= 7.5), ph < 6.0],
+            [1.25, 0.85 - ((6.0 - ph) * 0.05)],
+            default=1.0 - ((ph - 7.5) * 0.08)
+        )
+        ph_factor = np.clip(ph_factor, 0.5, 1.25)
+        ph_factor = np.where(np.isnan(ph), 1.0, ph_factor)
+        
+        # 5. Final Calculation + realistic range (5-35 mg/kg)
+        phosphorus = base_p * cec_factor * clay_factor * ph_factor
+        phosphorus = np.clip(phosphorus, 5.0, 35.0)
+        if rounded:
+            phosphorus = _round_half_even(phosphorus, 1)
+        
+        return np.where(valid, phosphorus, 12.0)
+    
+    def estimate_potassium_array(
+        self,
+        cec: np.ndarray,
+        clay: np.ndarray,
+        silt: np.ndarray,
+        soc: Optional[np.ndarray] = None,
+        rounded: bool = True
+    ) -> np.ndarray:
+        """
+        Columnar version of estimate_potassium (mg/kg)
+        
+        Rows with NaN or non-positive CEC get the default (200.0 mg/kg).
+        """
+        cec = np.asarray(cec, dtype=float)
+        clay = np.asarray(clay, dtype=float)
+        silt = np.asarray(silt, dtype=float)
+        if soc is None:
+            soc = np.full(cec.shape, np.nan)
+        soc = np.asarray(soc, dtype=float)
+        
+        valid = ~np.isnan(cec) & (cec > 0)
+        
+        # 1-2. Modified Egyptian Formula: K = CEC × 40 + 50
+        base_k = (cec * 40) + 50
+        
+        # 3. Clay Factor
+        clay_factor = np.select(
+            [clay < 20, (clay >= 20) & (clay <= 40)],
+            [0.8, 1.0 + ((clay - 30) / 100)],
+            default=0.9
+        )
+        clay_factor = np.clip(clay_factor, 0.7, 1.2)
+        clay_factor = np.where(~np.isnan(clay) & (clay > 0), clay_factor, 1.0)
         
         # 4. Silt Factor
-        if not pd.isna(silt) and silt > 0:
-            if 30 <= silt <= 50:
-                silt_factor = 1.05
-            elif silt > 50:
-                silt_factor = 1.0
-            else:
-                silt_factor = 0.95
-            silt_factor = max(0.9, min(1.1, silt_factor))
-        else:
-            silt_factor = 1.0
-        
-        # 5. SOC Factor - ✅ Convert SOC from g/kg to % first
-        if not pd.isna(soc) and soc > 0:
-            soc_percent = soc / 10.0  # g/kg → %
-            if soc_percent > 2.0:
-                soc_factor = 1.05
-            elif soc_percent > 1.0:
-                soc_factor = 1.02
-            else:
-                soc_factor = 1.0
-        else:
-            soc_factor = 1.0
+        silt_factor = np.select(
+            [(silt >= 30) & (silt <= 50), silt > 50],
+            [1.05, 1.0],
+            default=0.95
+        )
+        silt_factor = np.where(~np.isnan(silt) & (silt > 0), silt_factor, 1.0)
         
-        # 6. Final Calculation
+        # 5. SOC Factor (g/kg → %)
+        soc_percent = soc / 10.0
+        soc_factor = np.select(
+            [soc_percent > 2.0, soc_percent > 1.0],
+            [1.05, 1.02],
+            default=1.0
+        )
+        soc_factor = np.where(~np.isnan(soc) & (soc > 0), soc_factor, 1.0)
+        
+        # 6-7. Final Calculation + realistic range for Egyptian soils
         potassium = base_k * clay_factor * silt_factor * soc_factor
+        potassium = np.clip(potassium, 120.0, 350.0)
+        if rounded:
+            potassium = _round_half_even(potassium, 1)
+        
+        return np.where(valid, potassium, 200.0)
+    
+    def estimate_npk_arrays(
+        self,
+        soc: np.ndarray,
+        cec: np.ndarray,
+        clay: np.ndarray,
+        silt: np.ndarray,
+        ph: np.ndarray,
+        rounded: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Estimate N, P and K for whole columns in one NumPy pass
         
-        # 7. Realistic range for Egyptian soils
-        potassium = max(120.0, min(350.0, potassium))
+        rounded=False returns the clipped values before the final rounding.
         
-        return round(potassium, 1)
+        Returns:
+        --------
+        tuple: (nitrogen %, phosphorus mg/kg, potassium mg/kg)
+        """
+        with np.errstate(invalid='ignore'):
+            nitrogen = self.estimate_nitrogen_array(soc, rounded)
+            phosphorus = self.estimate_phosphorus_array(soc, cec, clay, ph, rounded)
+            potassium = self.estimate_potassium_array(cec, clay, silt, soc, rounded)
+        return nitrogen, phosphorus, potassium
+
+
+def _as_float_array(value) -> np.ndarray:
+    """Wrap a scalar input (None → NaN) as a 1-element float array"""
+    return np.array([np.nan if value is None else value], dtype=float)
+
+
+def _round_half_even(values: np.ndarray, decimals: int) -> np.ndarray:
+    """
+    Round like Python's built-in round()
+    
+    np.round scales by 10**decimals first, which can land on the other side
+    of a .5 tie; those few near-tie values are re-rounded with round().
+    """
+    rounded = np.round(values, decimals)
+    near_tie = _near_half_tie(values, decimals)
+    if near_tie.any():
+        rounded[near_tie] = [round(float(v), decimals) for v in values[near_tie]]
+    return rounded
+
+
+def _near_half_tie(values: np.ndarray, decimals: int) -> np.ndarray:
+    """Mask of values within rounding noise of a .5 tie at the given decimals"""
+    scaled = values * (10 ** decimals)
+    return np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
 
 
 def check_required_columns(df: pd.DataFrame) -> Tuple[bool, list]:
@@ -336,6 +418,41 @@ def convert_units_for_npk(df: pd.DataFrame) -> pd.DataFrame:
     return df_converted
 
 
+def _apply_npk_estimates(df_for_npk: pd.DataFrame, estimator: ScientificNPKEstimator):
+    """
+    Write corrected N, P, K and metadata columns into a unit-converted frame
+    
+    Modifies df_for_npk in place (SOC already in g/kg, CEC in cmol/kg).
+    """
+    npk_inputs = {}
+    invalid_rows = np.zeros(len(df_for_npk), dtype=bool)
+    for col in ['soc', 'cec', 'clay', 'silt', 'ph']:
+        values = pd.to_numeric(df_for_npk[col], errors='coerce')
+        # Non-numeric values used to raise inside the row loop
+        invalid_rows |= (values.isna() & df_for_npk[col].notna()).to_numpy()
+        npk_inputs[col] = values.to_numpy(dtype=float)
+    
+    corrected_n, corrected_p, corrected_k = estimator.estimate_npk_arrays(**npk_inputs)
+    
+    if invalid_rows.any():
+        logger.error(f"   Non-numeric soil values in {invalid_rows.sum()} rows, using defaults")
+        # Use default values for rows that cannot be processed
+        corrected_n[invalid_rows] = 0.15
+        corrected_p[invalid_rows] = 12.0
+        corrected_k[invalid_rows] = 150.0
+    
+    # Update values
+    df_for_npk['nitrogen'] = corrected_n
+    df_for_npk['phosphorus'] = corrected_p
+    df_for_npk['potassium'] = corrected_k
+    
+    # Add metadata
+    df_for_npk['npk_estimation_method'] = 'Scientific (Brady&Weil 2008, Sparks 2003, Havlin 2014)'
+    df_for_npk['npk_correction_date'] = datetime.now().isoformat()
+    df_for_npk['soc_unit'] = 'g/kg'  # ✅ Clarify SOC unit
+    df_for_npk['cec_unit'] = 'cmol/kg'  # ✅ Clarify CEC unit
+
+
 def apply_scientific_npk_correction(df: pd.DataFrame) -> pd.DataFrame:
     """
     Apply scientific correction on historical data
@@ -358,10 +475,11 @@ def apply_scientific_npk_correction(df: pd.DataFrame) -> pd.DataFrame:
         logger.error(f"❌ Missing required columns: {missing_columns}")
         raise ValueError(f"Data missing the following columns: {missing_columns}")
     
-    df_corrected = df.copy()
-    
     # ✅ Step 1: Convert units to be compatible with Real-time API
-    df_for_npk = convert_units_for_npk(df_corrected)
+    # (convert_units_for_npk returns a copy - the only one made here)
+    df_corrected = convert_units_for_npk(df)
+    profiling.mark_stage("after unit conversion")
+    df_for_npk = df_corrected
     
     estimator = ScientificNPKEstimator()
     
@@ -399,63 +517,11 @@ def apply_scientific_npk_correction(df: pd.DataFrame) -> pd.DataFrame:
         logger.info("   Potassium:  ❌ Column not found")
     
     # Apply scientific formulas
-    logger.info("\n🔄 Applying scientific formulas row by row...")
+    logger.info("\n🔄 Applying scientific formulas (vectorized)...")
     
-    corrected_n = []
-    corrected_p = []
-    corrected_k = []
+    _apply_npk_estimates(df_corrected, estimator)
     
-    for idx, row in df_for_npk.iterrows():
-        try:
-            # Nitrogen
-            n = estimator.estimate_nitrogen(row['soc'])
-            corrected_n.append(n)
-            
-            # Phosphorus
-            p = estimator.estimate_phosphorus(
-                soc=row['soc'],
-                cec=row['cec'],
-                clay=row['clay'],
-                ph=row['ph']
-            )
-            corrected_p.append(p)
-            
-            # Potassium
-            k = estimator.estimate_potassium(
-                cec=row['cec'],
-                clay=row['clay'],
-                silt=row['silt'],
-                soc=row['soc']
-            )
-            corrected_k.append(k)
-            
-        except Exception as e:
-            logger.error(f"   Error processing row {idx}: {e}")
-            # Use default values if error occurs
-            corrected_n.append(0.15)
-            corrected_p.append(12.0)
-            corrected_k.append(150.0)
-        
-        # Progress
-        if (idx + 1) % 500 == 0:
-            logger.info(f"   Processed {idx + 1}/{len(df_for_npk)} rows...")
-    
-    # Update values
-    df_corrected['nitrogen'] = corrected_n
-    df_corrected['phosphorus'] = corrected_p
-    df_corrected['potassium'] = corrected_k
-    
-    # ✅ Update SOC and CEC in final DataFrame
-    if 'soc' in df_for_npk.columns:
-        df_corrected['soc'] = df_for_npk['soc']  # SOC now in g/kg
-    if 'cec' in df_for_npk.columns:
-        df_corrected['cec'] = df_for_npk['cec']  # CEC now in cmol/kg
-    
-    # Add metadata
-    df_corrected['npk_estimation_method'] = 'Scientific (Brady&Weil 2008, Sparks 2003, Havlin 2014)'
-    df_corrected['npk_correction_date'] = datetime.now().isoformat()
-    df_corrected['soc_unit'] = 'g/kg'  # ✅ Clarify SOC unit
-    df_corrected['cec_unit'] = 'cmol/kg'  # ✅ Clarify CEC unit
+    logger.info(f"   Processed {len(df_for_npk)} rows")
     
     # Stats after correction
     logger.info("\n📊 AFTER CORRECTION (SCIENTIFIC VALUES):")
@@ -546,6 +612,502 @@ def apply_scientific_npk_correction(df: pd.DataFrame) -> pd.DataFrame:
     return df_corrected
 
 
+# ==================== IN-DATABASE CORRECTION ====================
+
+def _sql_clip(expr, low: float, high: float):
+    """SQL counterpart of np.clip for a single expression"""
+    from sqlalchemy import case
+    return case((expr < low, low), (expr > high, high), else_=expr)
+
+
+def build_npk_sql_expressions(table, estimator: Optional[ScientificNPKEstimator] = None) -> Dict:
+    """
+    Express unit conversion + ScientificNPKEstimator as SQL CASE expressions
+    
+    Mirrors the *_array methods of the estimator term by term, so every
+    NULL/non-positive fallback and clipping range is applied in the database.
+    The soc/cec inputs are the stored (unconverted) columns; the returned
+    dict maps each updated column to its new value.
+    """
+    from sqlalchemy import case, func, literal
+    
+    estimator = estimator or ScientificNPKEstimator()
+    params = estimator.egyptian_params
+    
+    # Unit conversion (same as convert_units_for_npk)
+    soc = table.c.soc * 10.0   # % → g/kg
+    cec = table.c.cec / 10.0   # mmol/kg → cmol/kg
+    clay = table.c.clay
+    silt = table.c.silt
+    ph = table.c.ph
+    soc_valid = table.c.soc > 0   # NULL compares as unknown → falls to ELSE
+    cec_valid = table.c.cec > 0
+    
+    # Nitrogen
+    nitrogen = case(
+        (soc_valid, func.round(_sql_clip(soc / 10.0 / params['n_cn_ratio'], 0.05, 0.5), 3)),
+        else_=0.15
+    )
+    
+    # Phosphorus factors
+    cec_factor = case(
+        (cec_valid, _sql_clip(
+            case((cec > 20, 1.0 - ((cec - 20) / 200.0)), else_=1.0 + ((20 - cec) / 100.0)),
+            0.7, 1.3
+        )),
+        else_=1.0
+    )
+    clay_factor_p = case(
+        (clay > 0, _sql_clip(case((clay > 30, 1.0 - ((clay - 30) / 150.0)), else_=1.0), 0.6, 1.2)),
+        else_=1.0
+    )
+    ph_factor = case(
+        (ph.is_(None), 1.0),
+        else_=_sql_clip(
+            case(
+                ((ph >= 6.0) & (ph <= 7.5), 1.25),
+                (ph < 6.0, 0.85 - ((6.0 - ph) * 0.05)),
+                else_=1.0 - ((ph - 7.5) * 0.08)
+            ),
+            0.5, 1.25
+        )
+    )
+    phosphorus = case(
+        (soc_valid, func.round(_sql_clip(
+            (soc / 10.0) * params['p_base_factor'] * cec_factor * clay_factor_p * ph_factor,
+            5.0, 35.0
+        ), 1)),
+        else_=12.0
+    )
+    
+    # Potassium factors
+    clay_factor_k = case(
+        (clay > 0, _sql_clip(
+            case(
+                (clay < 20, 0.8),
+                ((clay >= 20) & (clay <= 40), 1.0 + ((clay - 30) / 100.0)),
+                else_=0.9
+            ),
+            0.7, 1.2
+        )),
+        else_=1.0
+    )
+    silt_factor = case(
+        ((silt >= 30) & (silt <= 50), 1.05),
+        (silt > 50, 1.0),
+        (silt > 0, 0.95),
+        else_=1.0
+    )
+    soc_factor = case(
+        (soc_valid & (soc / 10.0 > 2.0), 1.05),
+        (soc_valid & (soc / 10.0 > 1.0), 1.02),
+        else_=1.0
+    )
+    potassium = case(
+        (cec_valid, func.round(_sql_clip(
+            ((cec * 40) + 50) * clay_factor_k * silt_factor * soc_factor,
+            120.0, 350.0
+        ), 1)),
+        else_=200.0
+    )
+    
+    return {
+        'soc': soc,
+        'cec': cec,
+        'nitrogen': nitrogen,
+        'phosphorus': phosphorus,
+        'potassium': potassium,
+        'npk_estimation_method': literal('Scientific (Brady&Weil 2008, Sparks 2003, Havlin 2014)'),
+        'npk_correction_date': literal(datetime.now().isoformat()),
+        'soc_unit': literal('g/kg'),
+        'cec_unit': literal('cmol/kg'),
+    }
+
+
+def apply_scientific_npk_correction_sql(
+    db,
+    batch_size: int = 50000,
+    verify: bool = True,
+    repair_ties: bool = False
+) -> int:
+    """
+    Apply the NPK correction in place on historical_data
+    
+    Rows are updated in id-range batches, one transaction each. Only rows not
+    yet in g/kg (soc_unit) are touched, so an interrupted run can be restarted
+    without converting units twice.
+    
+    Parameters:
+    -----------
+    db : DatabaseManager
+        Connected database manager (main_pipeline)
+    batch_size : int
+        Width of each id range
+    verify : bool
+        Cross-check every stored row against the Python engine afterwards
+    repair_ties : bool
+        Let the verification rewrite .5 rounding ties with the Python values
+        
+    Returns:
+    --------
+    int
+        Number of rows updated
+    """
+    from sqlalchemy import func, or_, select
+    
+    logger.info("="*80)
+    logger.info("🔬 APPLYING SCIENTIFIC NPK CORRECTION (IN DATABASE)")
+    logger.info("="*80)
+    
+    table = db.backend._get_table('historical_data')
+    values = build_npk_sql_expressions(table)
+    pending = or_(table.c.soc_unit.is_(None), table.c.soc_unit != 'g/kg')
+    
+    with db.engine.connect() as conn:
+        min_id, max_id = conn.execute(
+            select(func.min(table.c.id), func.max(table.c.id)).where(pending)
+        ).fetchone()
+    
+    if min_id is None:
+        logger.info("✅ No rows pending correction")
+        return 0
+    
+    updated = 0
+    for start in range(min_id, max_id + 1, batch_size):
+        end = start + batch_size - 1
+        statement = table.update().where(table.c.id.between(start, end), pending).values(values)
+        with db.engine.begin() as conn:
+            updated += conn.execute(statement).rowcount
+        logger.info(f"   Updated ids {start}-{min(end, max_id)} ({updated} rows so far)")
+    
+    logger.info(f"✅ Corrected {updated} rows in place")
+    
+    if verify:
+        mismatches = verify_sql_npk_correction(db, batch_size, repair=repair_ties)
+        if mismatches:
+            raise ValueError(f"In-database NPK correction differs from Python engine in {mismatches} rows")
+    
+    return updated
+
+
+def verify_sql_npk_correction(db, chunksize: int = 50000, repair: bool = False) -> int:
+    """
+    Cross-check stored NPK values row by row against ScientificNPKEstimator
+    
+    SQL ROUND() rounds the decimal value half away from zero while the Python
+    engine rounds the binary float, so values sitting on a .5 boundary can end
+    up one last digit apart. A row is only treated as such a tie when every
+    differing column is one unit apart AND its unrounded Python value is a
+    genuine half-unit tie. Ties are only reported; repair=True rewrites those
+    rows with the Python values. Every other difference is a real mismatch.
+    
+    Returns the number of real mismatches (0 means identical results).
+    """
+    from sqlalchemy import bindparam
+    
+    estimator = ScientificNPKEstimator()
+    table = db.backend._get_table('historical_data')
+    columns = ['id', 'soc', 'cec', 'clay', 'silt', 'ph', 'nitrogen', 'phosphorus', 'potassium']
+    rounding_decimals = {'nitrogen': 3, 'phosphorus': 1, 'potassium': 1}
+    
+    checked = 0
+    mismatches = 0
+    repairs = []
+    for chunk in db.read_historical_data(columns=columns, chunksize=chunksize):
+        inputs = {col: chunk[col].to_numpy(dtype=float) for col in ['soc', 'cec', 'clay', 'silt', 'ph']}
+        n, p, k = estimator.estimate_npk_arrays(**inputs)
+        expected = {'nitrogen': n, 'phosphorus': p, 'potassium': k}
+        unrounded = dict(zip(expected, estimator.estimate_npk_arrays(**inputs, rounded=False)))
+        
+        differs = np.zeros(len(chunk), dtype=bool)
+        beyond_rounding = np.zeros(len(chunk), dtype=bool)
+        for col, decimals in rounding_decimals.items():
+            diff = np.abs(chunk[col].to_numpy(dtype=float) - expected[col])
+            column_differs = ~(diff <= 1e-9)
+            rounding_tie = (diff <= 10.0 ** -decimals + 1e-9) & _near_half_tie(unrounded[col], decimals)
+            differs |= column_differs
+            beyond_rounding |= column_differs & ~rounding_tie
+        
+        if beyond_rounding.any():
+            for _, row in chunk[beyond_rounding].head(5).iterrows():
+                logger.error(f"   ❌ id {row['id']}: N={row['nitrogen']}, P={row['phosphorus']}, K={row['potassium']}")
+        
+        tie_rows = np.flatnonzero(differs & ~beyond_rounding)
+        repairs.extend(
+            {
+                'row_id': int(chunk['id'].iat[i]),
+                'nitrogen': float(n[i]),
+                'phosphorus': float(p[i]),
+                'potassium': float(k[i])
+            }
+            for i in tie_rows
+        )
+        
+        checked += len(chunk)
+        mismatches += int(beyond_rounding.sum())
+    
+    if repairs:
+        logger.info(f"   {len(repairs)} rows differ only by .5 rounding")
+        if repair:
+            statement = table.update().where(table.c.id == bindparam('row_id')).values(
+                nitrogen=bindparam('nitrogen'),
+                phosphorus=bindparam('phosphorus'),
+                potassium=bindparam('potassium')
+            )
+            with db.engine.begin() as conn:
+                conn.execute(statement, repairs)
+            logger.info(f"   Rewrote {len(repairs)} rows with Python-rounded values")
+    
+    if mismatches:
+        logger.error(f"❌ Verification: {mismatches} of {checked} rows differ from Python engine")
+    else:
+        logger.info(f"✅ Verification: all {checked} rows match Python engine")
+    
+    return mismatches
+
+
+# ==================== COLUMNAR OUTPUT ====================
+
+# Measurements stored as float32 (coordinates keep float64 precision)
+FLOAT32_COLUMNS = [
+    'sand', 'silt', 'clay', 'soc', 'ph', 'bdod', 'cec',
+    'ndvi', 't2m_c', 'td2m_c', 'rh_pct', 'tp_m', 'ssrd_jm2',
+    'data_quality_score', 'nitrogen', 'phosphorus', 'potassium'
+]
+
+# Calendar / class codes that fit in small integers
+SMALL_INT_COLUMNS = {
+    'year': 'int16',
+    'month': 'int8',
+    'lc_type1': 'int16',
+    'soil_version_year': 'int16',
+    'soil_data_year': 'int16',
+}
+
+# Strings repeated on (almost) every row - dictionary-encoded
+CATEGORICAL_COLUMNS = [
+    'location_name', 'npk_estimation_method', 'npk_correction_date',
+    'soc_unit', 'cec_unit', 'ndvi_source', 'climate_source', 'lc_source'
+]
+
+# Row timestamps exported as text
+TIMESTAMP_COLUMNS = ['created_at', 'updated_at']
+
+# Row key and coordinates at full precision
+FULL_PRECISION_COLUMNS = {
+    'id': 'int64',
+    'latitude': 'float64',
+    'longitude': 'float64',
+}
+
+
+def historical_arrow_schema(df: pd.DataFrame):
+    """
+    Explicit Arrow schema for the historical dataset
+    
+    Known columns get their declared types whatever the values in df, so
+    every chunk of a chunked write maps to the same schema. Any other
+    column is float64 if numeric, else string.
+    """
+    import pyarrow as pa
+    
+    fields = []
+    for col in df.columns:
+        if col in FLOAT32_COLUMNS:
+            fields.append(pa.field(col, pa.float32()))
+        elif col in SMALL_INT_COLUMNS:
+            fields.append(pa.field(col, pa.from_numpy_dtype(np.dtype(SMALL_INT_COLUMNS[col]))))
+        elif col in CATEGORICAL_COLUMNS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif col in TIMESTAMP_COLUMNS:
+            # Microseconds: DATETIME2 and pandas timestamps carry sub-ms precision
+            fields.append(pa.field(col, pa.timestamp('us')))
+        elif col in FULL_PRECISION_COLUMNS:
+            fields.append(pa.field(col, pa.from_numpy_dtype(np.dtype(FULL_PRECISION_COLUMNS[col]))))
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            fields.append(pa.field(col, pa.float64()))
+        else:
+            # Not inferred - an all-null column would become type null
+            fields.append(pa.field(col, pa.string()))
+    
+    return pa.schema(fields)
+
+
+def _to_arrow_table(df: pd.DataFrame, schema=None):
+    """Convert a DataFrame to an Arrow table with the compact schema (or the given one)"""
+    import pyarrow as pa
+    
+    if schema is None:
+        schema = historical_arrow_schema(df)
+    arrays = []
+    for field in schema:
+        values = df[field.name]
+        if pa.types.is_integer(field.type):
+            # Float columns holding whole numbers (NaN for missing)
+            values = values.astype(f"Int{field.type.bit_width}")
+        if pa.types.is_timestamp(field.type):
+            values = pd.to_datetime(values, errors='coerce')
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values.astype(object), type=pa.string(), from_pandas=True).dictionary_encode())
+        else:
+            arrays.append(pa.Array.from_pandas(values, type=field.type))
+    
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_columnar(df: pd.DataFrame, output_file: str):
+    """
+    Write the dataset as Parquet (.parquet) or Feather (.feather / .arrow)
+    
+    Requires pyarrow.
+    """
+    table = _to_arrow_table(df)
+    
+    if str(output_file).endswith('.parquet'):
+        import pyarrow.parquet as pq
+        pq.write_table(table, output_file, compression='zstd')
+    else:
+        import pyarrow.feather as feather
+        # Uncompressed so the loader can memory-map it without a copy
+        feather.write_feather(table, output_file, compression='uncompressed')
+    
+    logger.info(f"   Wrote {table.num_rows} rows ({table.nbytes / 1e6:.1f} MB in memory) to {output_file}")
+
+
+def load_columnar(input_file: str, columns: Optional[list] = None) -> pd.DataFrame:
+    """
+    Load a Parquet/Feather file written by write_columnar (memory-mapped)
+    
+    Dictionary columns come back as pandas categoricals and measurements
+    stay float32.
+    """
+    if str(input_file).endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(input_file, columns=columns, memory_map=True)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(input_file, columns=columns, memory_map=True)
+    
+    return table.to_pandas(self_destruct=True)
+
+
+# ==================== SUMMARY STATISTICS ====================
+
+class ColumnStats:
+    """
+    Mergeable min/max/mean/std for one column
+    
+    Partial results from separate chunks are combined with the parallel
+    variance formula (Chan et al.), so the merged std equals pandas' std
+    (ddof=1) over the full column.
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+    
+    def update(self, series: pd.Series):
+        """Fold one chunk of values into the running statistics"""
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        
+        chunk = ColumnStats()
+        chunk.count = len(values)
+        chunk.mean = float(values.mean())
+        chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        self.merge(chunk)
+    
+    def merge(self, other: 'ColumnStats'):
+        """Combine with statistics computed on another chunk"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+    
+    def as_dict(self) -> Dict:
+        """Same keys as get_npk_column_stats"""
+        return {
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean if self.count else np.nan,
+            'std': np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        }
+
+
+class CorrectionSummary:
+    """
+    Before/after statistics for the comparison report, built chunk by chunk
+    
+    Only aggregates are kept (plus the set of location names), so memory
+    does not grow with the number of rows.
+    """
+    
+    STAT_COLUMNS = ['nitrogen', 'phosphorus', 'potassium', 'soc', 'cec']
+    
+    def __init__(self):
+        self.rows = 0
+        self.columns = 0
+        self.year_range = None
+        self.locations = None
+        self.first_row = None
+        self.before = {}
+        self.after = {col: ColumnStats() for col in self.STAT_COLUMNS}
+    
+    def update_before(self, df_original: pd.DataFrame):
+        """Record original values (call before units are converted)"""
+        for col in self.STAT_COLUMNS:
+            if col in df_original.columns:
+                self.before.setdefault(col, ColumnStats()).update(df_original[col])
+    
+    def update_after(self, df_corrected: pd.DataFrame):
+        """Record corrected values and dataset info"""
+        if len(df_corrected) == 0:
+            return
+        
+        if self.first_row is None:
+            self.first_row = df_corrected.iloc[0]
+        
+        self.rows += len(df_corrected)
+        self.columns = len(df_corrected.columns)
+        
+        for col in self.STAT_COLUMNS:
+            if col in df_corrected.columns:
+                self.after[col].update(df_corrected[col])
+        
+        if 'year' in df_corrected.columns:
+            low, high = df_corrected['year'].min(), df_corrected['year'].max()
+            if self.year_range is not None:
+                low, high = min(low, self.year_range[0]), max(high, self.year_range[1])
+            self.year_range = (low, high)
+        
+        if 'location_name' in df_corrected.columns:
+            if self.locations is None:
+                self.locations = set()
+            self.locations.update(df_corrected['location_name'].dropna().unique())
+    
+    def update(self, df_original: pd.DataFrame, df_corrected: pd.DataFrame):
+        """Record one original/corrected pair"""
+        self.update_before(df_original)
+        self.update_after(df_corrected)
+
+
 def create_detailed_comparison_report(
     df_original: pd.DataFrame,
     df_corrected: pd.DataFrame,
@@ -554,6 +1116,17 @@ def create_detailed_comparison_report(
     """
     Create detailed comparison report
     """
+    summary = CorrectionSummary()
+    summary.update(df_original, df_corrected)
+    write_comparison_report(summary, output_file)
+
+
+def write_comparison_report(summary: 'CorrectionSummary', output_file: str):
+    """
+    Write the comparison report from (possibly merged) summary statistics
+    """
+    before = summary.before
+    after = {col: stats.as_dict() for col, stats in summary.after.items()}
     
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write("="*80 + "\n")
@@ -566,12 +1139,12 @@ def create_detailed_comparison_report(
         f.write("  ✅ All units now match Real-time API\n\n")
         
         f.write("DATASET INFO:\n")
-        f.write(f"  Total rows: {len(df_corrected)}\n")
-        if 'year' in df_corrected.columns:
-            f.write(f"  Date range: {df_corrected['year'].min()}-{df_corrected['year'].max()}\n")
-        if 'location_name' in df_corrected.columns:
-            f.write(f"  Locations: {df_corrected['location_name'].nunique()}\n")
-        f.write(f"  Columns: {len(df_corrected.columns)}\n\n")
+        f.write(f"  Total rows: {summary.rows}\n")
+        if summary.year_range is not None:
+            f.write(f"  Date range: {summary.year_range[0]}-{summary.year_range[1]}\n")
+        if summary.locations is not None:
+            f.write(f"  Locations: {len(summary.locations)}\n")
+        f.write(f"  Columns: {summary.columns}\n\n")
         
         f.write("FINAL UNITS IN DATASET:\n")
         f.write("  SOC: g/kg\n")
@@ -608,63 +1181,66 @@ def create_detailed_comparison_report(
         
         # Nitrogen
         f.write("NITROGEN (%):\n")
-        if 'nitrogen' in df_original.columns:
-            f.write(f"  Before: Min={df_original['nitrogen'].min():.3f}, ")
-            f.write(f"Max={df_original['nitrogen'].max():.3f}, ")
-            f.write(f"Mean={df_original['nitrogen'].mean():.3f}, ")
-            f.write(f"Std={df_original['nitrogen'].std():.3f}\n")
+        if 'nitrogen' in before:
+            stats = before['nitrogen'].as_dict()
+            f.write(f"  Before: Min={stats['min']:.3f}, ")
+            f.write(f"Max={stats['max']:.3f}, ")
+            f.write(f"Mean={stats['mean']:.3f}, ")
+            f.write(f"Std={stats['std']:.3f}\n")
         else:
             f.write("  Before: Values were minimum defaults\n")
         
-        f.write(f"  After:  Min={df_corrected['nitrogen'].min():.3f}, ")
-        f.write(f"Max={df_corrected['nitrogen'].max():.3f}, ")
-        f.write(f"Mean={df_corrected['nitrogen'].mean():.3f}, ")
-        f.write(f"Std={df_corrected['nitrogen'].std():.3f}\n\n")
+        f.write(f"  After:  Min={after['nitrogen']['min']:.3f}, ")
+        f.write(f"Max={after['nitrogen']['max']:.3f}, ")
+        f.write(f"Mean={after['nitrogen']['mean']:.3f}, ")
+        f.write(f"Std={after['nitrogen']['std']:.3f}\n\n")
         
         # Phosphorus
         f.write("PHOSPHORUS (mg/kg):\n")
-        if 'phosphorus' in df_original.columns:
-            f.write(f"  Before: Min={df_original['phosphorus'].min():.1f}, ")
-            f.write(f"Max={df_original['phosphorus'].max():.1f}, ")
-            f.write(f"Mean={df_original['phosphorus'].mean():.1f}, ")
-            f.write(f"Std={df_original['phosphorus'].std():.1f}\n")
+        if 'phosphorus' in before:
+            stats = before['phosphorus'].as_dict()
+            f.write(f"  Before: Min={stats['min']:.1f}, ")
+            f.write(f"Max={stats['max']:.1f}, ")
+            f.write(f"Mean={stats['mean']:.1f}, ")
+            f.write(f"Std={stats['std']:.1f}\n")
         else:
             f.write("  Before: Values were minimum defaults\n")
         
-        f.write(f"  After:  Min={df_corrected['phosphorus'].min():.1f}, ")
-        f.write(f"Max={df_corrected['phosphorus'].max():.1f}, ")
-        f.write(f"Mean={df_corrected['phosphorus'].mean():.1f}, ")
-        f.write(f"Std={df_corrected['phosphorus'].std():.1f}\n\n")
+        f.write(f"  After:  Min={after['phosphorus']['min']:.1f}, ")
+        f.write(f"Max={after['phosphorus']['max']:.1f}, ")
+        f.write(f"Mean={after['phosphorus']['mean']:.1f}, ")
+        f.write(f"Std={after['phosphorus']['std']:.1f}\n\n")
         
         # Potassium
         f.write("POTASSIUM (mg/kg):\n")
-        if 'potassium' in df_original.columns:
-            f.write(f"  Before: Min={df_original['potassium'].min():.1f}, ")
-            f.write(f"Max={df_original['potassium'].max():.1f}, ")
-            f.write(f"Mean={df_original['potassium'].mean():.1f}, ")
-            f.write(f"Std={df_original['potassium'].std():.1f}\n")
+        if 'potassium' in before:
+            stats = before['potassium'].as_dict()
+            f.write(f"  Before: Min={stats['min']:.1f}, ")
+            f.write(f"Max={stats['max']:.1f}, ")
+            f.write(f"Mean={stats['mean']:.1f}, ")
+            f.write(f"Std={stats['std']:.1f}\n")
         else:
             f.write("  Before: Values were minimum defaults\n")
         
-        f.write(f"  After:  Min={df_corrected['potassium'].min():.1f}, ")
-        f.write(f"Max={df_corrected['potassium'].max():.1f}, ")
-        f.write(f"Mean={df_corrected['potassium'].mean():.1f}, ")
-        f.write(f"Std={df_corrected['potassium'].std():.1f}\n\n")
+        f.write(f"  After:  Min={after['potassium']['min']:.1f}, ")
+        f.write(f"Max={after['potassium']['max']:.1f}, ")
+        f.write(f"Mean={after['potassium']['mean']:.1f}, ")
+        f.write(f"Std={after['potassium']['std']:.1f}\n\n")
         
         # Unit changes
         f.write("UNIT CHANGES:\n")
-        if 'soc' in df_original.columns and 'soc' in df_corrected.columns:
-            f.write(f"  SOC: {df_original['soc'].mean():.2f} % → {df_corrected['soc'].mean():.2f} g/kg\n")
-        if 'cec' in df_original.columns and 'cec' in df_corrected.columns:
-            f.write(f"  CEC: {df_original['cec'].mean():.2f} mmol/kg → {df_corrected['cec'].mean():.2f} cmol/kg\n")
+        if 'soc' in before and 'soc' in after:
+            f.write(f"  SOC: {before['soc'].as_dict()['mean']:.2f} % → {after['soc']['mean']:.2f} g/kg\n")
+        if 'cec' in before and 'cec' in after:
+            f.write(f"  CEC: {before['cec'].as_dict()['mean']:.2f} mmol/kg → {after['cec']['mean']:.2f} cmol/kg\n")
         
         # Example calculations
         f.write("\n" + "="*80 + "\n")
         f.write("EXAMPLE CALCULATION (First row):\n")
         f.write("="*80 + "\n\n")
         
-        if len(df_corrected) > 0:
-            row = df_corrected.iloc[0]
+        if summary.first_row is not None:
+            row = summary.first_row
             
             f.write(f"Location: {row['location_name']}\n")
             f.write(f"  SOC: {row['soc']:.2f} g/kg ({row['soc']/10:.2f}%)\n")
@@ -706,6 +1282,173 @@ def create_detailed_comparison_report(
     logger.info(f"📄 Detailed report saved: {output_file}")
 
 
+def load_historical_data(
+    source: str,
+    input_file: Optional[str] = None,
+    locations: Optional[list] = None,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    min_quality: Optional[float] = None,
+    chunksize: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Load the whole historical dataset into one DataFrame
+    
+    source='database' reads historical_data through DatabaseManager with the
+    filters pushed down into the query, so no manual export is needed.
+    
+    This is the in-memory path: the full table is materialized (the chunks
+    are concatenated once at the end). For datasets that do not fit in
+    memory use iter_historical_chunks with
+    apply_scientific_npk_correction_chunked (processing_mode='chunked'),
+    or correction_mode='sql' to update the table in place.
+    """
+    if source == 'csv':
+        return pd.read_csv(input_file)
+    
+    chunks = list(iter_historical_chunks(
+        source,
+        input_file,
+        chunksize,
+        locations=locations,
+        start_year=start_year,
+        end_year=end_year,
+        min_quality=min_quality
+    ))
+    
+    if not chunks:
+        return pd.DataFrame()
+    
+    return pd.concat(chunks, ignore_index=True)
+
+
+# ==================== OUT-OF-CORE MODE ====================
+
+def iter_historical_chunks(
+    source: str,
+    input_file: Optional[str] = None,
+    chunksize: Optional[int] = 100000,
+    **filters
+):
+    """
+    Yield the input dataset in DataFrames of at most chunksize rows
+    
+    source='csv' reads the file incrementally; source='database' streams
+    historical_data with the filters of load_historical_data.
+    """
+    if source == 'csv':
+        yield from pd.read_csv(input_file, chunksize=chunksize)
+        return
+    
+    if source != 'database':
+        raise ValueError(f"Unknown input source: {source}")
+    
+    from main_pipeline import DatabaseManager
+    yield from DatabaseManager().read_historical_data(chunksize=chunksize, **filters)
+
+
+class ChunkedOutputWriter:
+    """
+    Append corrected chunks to a CSV or Parquet file
+    
+    Feather is not supported here: its dictionary-encoded columns cannot
+    change between record batches, so it needs the whole dataset at once.
+    """
+    
+    def __init__(self, output_file: str, output_format: str = 'csv'):
+        if output_format not in ('csv', 'parquet'):
+            raise ValueError(f"Chunked output supports csv or parquet, not {output_format}")
+        
+        self.output_file = output_file
+        self.output_format = output_format
+        self.rows = 0
+        self._parquet_writer = None
+        self._schema = None
+    
+    def write(self, chunk: pd.DataFrame):
+        if self.output_format == 'csv':
+            chunk.to_csv(
+                self.output_file,
+                mode='w' if self.rows == 0 else 'a',
+                header=self.rows == 0,
+                index=False
+            )
+        else:
+            # Every chunk is converted straight to the first chunk's declared schema
+            if self._schema is None:
+                self._schema = historical_arrow_schema(chunk)
+            table = _to_arrow_table(chunk[self._schema.names], self._schema)
+            if self._parquet_writer is None:
+                import pyarrow.parquet as pq
+                self._parquet_writer = pq.ParquetWriter(self.output_file, self._schema, compression='zstd')
+            self._parquet_writer.write_table(table)
+        
+        self.rows += len(chunk)
+    
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def apply_scientific_npk_correction_chunked(
+    chunks,
+    output_file: str,
+    output_format: str = 'csv'
+) -> CorrectionSummary:
+    """
+    Out-of-core NPK correction
+    
+    Each chunk is unit-converted and corrected in place, appended to
+    output_file and folded into the summary statistics, so peak memory is
+    about one chunk regardless of the dataset size.
+    
+    Returns:
+    --------
+    CorrectionSummary
+        Merged before/after statistics for write_comparison_report
+    """
+    logger.info("="*80)
+    logger.info("🔬 APPLYING SCIENTIFIC NPK CORRECTION (CHUNKED)")
+    logger.info("="*80)
+    
+    estimator = ScientificNPKEstimator()
+    summary = CorrectionSummary()
+    
+    with ChunkedOutputWriter(output_file, output_format) as writer:
+        for chunk in chunks:
+            has_required, missing_columns = check_required_columns(chunk)
+            if not has_required:
+                raise ValueError(f"Data missing the following columns: {missing_columns}")
+            
+            summary.update_before(chunk)
+            
+            # Same conversion as convert_units_for_npk, without the extra copy
+            chunk['soc'] = chunk['soc'] * 10.0    # % → g/kg
+            chunk['cec'] = chunk['cec'] / 10.0    # mmol/kg → cmol/kg
+            _apply_npk_estimates(chunk, estimator)
+            
+            summary.update_after(chunk)
+            writer.write(chunk)
+            logger.info(f"   Processed {writer.rows} rows")
+            profiling.mark_stage(f"chunk through row {writer.rows}")
+    
+    after = {col: stats.as_dict() for col, stats in summary.after.items()}
+    logger.info("\n📊 AFTER CORRECTION (SCIENTIFIC VALUES):")
+    logger.info(f"   Nitrogen:   {after['nitrogen']['min']:.3f} - {after['nitrogen']['max']:.3f}%")
+    logger.info(f"   Phosphorus: {after['phosphorus']['min']:.1f} - {after['phosphorus']['max']:.1f} mg/kg")
+    logger.info(f"   Potassium:  {after['potassium']['min']:.1f} - {after['potassium']['max']:.1f} mg/kg")
+    logger.info("✅ SCIENTIFIC NPK CORRECTION COMPLETE")
+    
+    return summary
+
+
 def main():
     """
     Main Execution
@@ -724,47 +1467,88 @@ def main():
     print("   5. Generate detailed comparison report")
     print("="*80)
     
+    # Input source: 'csv' (exported file) or 'database' (historical_data table)
+    input_source = 'csv'
+    
+    # Correction mode: 'pandas' (load → correct → write file) or
+    # 'sql' (update historical_data in place, no export/re-ingest)
+    correction_mode = 'pandas'
+    
+    # Output format: 'csv', 'parquet' or 'feather' (columnar formats need pyarrow)
+    output_format = 'csv'
+    
+    # Processing mode: 'in_memory' or 'chunked' (constant memory, csv/parquet output)
+    processing_mode = 'in_memory'
+    chunk_rows = 100000
+    
     # File paths
     input_file = r'D:\Grad Project Data\Historical Data\historical_data_export.csv'
     output_file = r'D:\Grad Project Data\Historical Data\historical_data_SCIENTIFIC_NPK_FINAL_UNIFIED.csv'
+    if output_format != 'csv':
+        output_file = output_file[:-len('.csv')] + f'.{output_format}'
     report_file = r'D:\Grad Project Data\Historical Data\npk_correction_detailed_report.txt'
     
     try:
-        # 1. Load data
-        logger.info(f"\n📥 Loading data from: {input_file}")
-        df_original = pd.read_csv(input_file)
-        logger.info(f"   Loaded {len(df_original)} rows, {len(df_original.columns)} columns")
-        
-        # 2. Apply scientific correction
-        df_corrected = apply_scientific_npk_correction(df_original)
-        
-        # 3. Save corrected data
-        logger.info(f"\n💾 Saving corrected data to: {output_file}")
-        df_corrected.to_csv(output_file, index=False)
-        logger.info(f"   Saved {len(df_corrected)} rows successfully")
-        
-        # 4. Create comparison report
-        logger.info(f"\n📝 Creating detailed comparison report...")
-        create_detailed_comparison_report(df_original, df_corrected, report_file)
-        
-        # 5. Final summary
-        logger.info("\n" + "="*80)
-        logger.info("🎯 PROCESS COMPLETE")
-        logger.info("="*80)
-        logger.info(f"✅ Corrected dataset: {output_file}")
-        logger.info(f"✅ Detailed report: {report_file}")
-        logger.info("\n📚 All NPK values now calculated using:")
-        logger.info("   - Brady & Weil (2008) - N from SOC (C:N = 11.5)")
-        logger.info("   - Sparks (2003) - P availability factors")
-        logger.info("   - Havlin et al. (2014) - K dynamics")
-        logger.info("   - Abdel-Fattah (2012) - Egyptian P factor (8.5)")
-        logger.info("   - El-Baroudy (2016) - Nile Delta K factor (7.2)")
-        logger.info("\n📐 Units now unified with Real-time API:")
-        logger.info("   - SOC: g/kg ✓")
-        logger.info("   - CEC: cmol/kg ✓")
-        logger.info("   - NPK: %, mg/kg, mg/kg ✓")
-        logger.info("\n🔗 Data is now consistent between historical and real-time")
-        logger.info("="*80)
+        # Profiled with --profile[=mode] or HISTORICAL_PROFILE; reports go next to the report file
+        with profiling.profile_run('preprocessing_historical', Path(report_file).parent):
+            if correction_mode == 'sql':
+                from main_pipeline import DatabaseManager
+                apply_scientific_npk_correction_sql(DatabaseManager(), repair_ties=True)
+                profiling.mark_stage("after NPK correction")
+                return
+            
+            if processing_mode == 'chunked':
+                logger.info(f"\n📥 Streaming data in chunks of {chunk_rows} rows")
+                summary = apply_scientific_npk_correction_chunked(
+                    iter_historical_chunks(input_source, input_file, chunk_rows),
+                    output_file,
+                    output_format
+                )
+                profiling.mark_stage("after NPK correction")
+                logger.info(f"   Saved {summary.rows} rows to: {output_file}")
+                write_comparison_report(summary, report_file)
+                return
+            
+            # 1. Load data
+            logger.info(f"\n📥 Loading data from: {input_file if input_source == 'csv' else 'historical_data table'}")
+            df_original = load_historical_data(input_source, input_file)
+            logger.info(f"   Loaded {len(df_original)} rows, {len(df_original.columns)} columns")
+            profiling.mark_stage("after load")
+            
+            # 2. Apply scientific correction
+            df_corrected = apply_scientific_npk_correction(df_original)
+            profiling.mark_stage("after NPK correction")
+            
+            # 3. Save corrected data
+            logger.info(f"\n💾 Saving corrected data to: {output_file}")
+            if output_format == 'csv':
+                df_corrected.to_csv(output_file, index=False)
+            else:
+                write_columnar(df_corrected, output_file)
+            logger.info(f"   Saved {len(df_corrected)} rows successfully")
+            
+            # 4. Create comparison report
+            logger.info(f"\n📝 Creating detailed comparison report...")
+            create_detailed_comparison_report(df_original, df_corrected, report_file)
+            
+            # 5. Final summary
+            logger.info("\n" + "="*80)
+            logger.info("🎯 PROCESS COMPLETE")
+            logger.info("="*80)
+            logger.info(f"✅ Corrected dataset: {output_file}")
+            logger.info(f"✅ Detailed report: {report_file}")
+            logger.info("\n📚 All NPK values now calculated using:")
+            logger.info("   - Brady & Weil (2008) - N from SOC (C:N = 11.5)")
+            logger.info("   - Sparks (2003) - P availability factors")
+            logger.info("   - Havlin et al. (2014) - K dynamics")
+            logger.info("   - Abdel-Fattah (2012) - Egyptian P factor (8.5)")
+            logger.info("   - El-Baroudy (2016) - Nile Delta K factor (7.2)")
+            logger.info("\n📐 Units now unified with Real-time API:")
+            logger.info("   - SOC: g/kg ✓")
+            logger.info("   - CEC: cmol/kg ✓")
+            logger.info("   - NPK: %, mg/kg, mg/kg ✓")
+            logger.info("\n🔗 Data is now consistent between historical and real-time")
+            logger.info("="*80)
         
     except FileNotFoundError:
         logger.error(f"\n❌ File not found: {input_file}")
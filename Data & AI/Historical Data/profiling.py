@@ -0,0 +1,330 @@
+"""
+================================================================================
+PROFILING - OPT-IN CPU AND MEMORY PROFILES FOR THE ENTRY POINTS
+================================================================================
+
+Runs main_pipeline.main / preprocessing_historical.main under a CPU profiler
+and takes tracemalloc snapshots at stage boundaries, without editing the code.
+
+Enable with an environment variable or a command line flag:
+    HISTORICAL_PROFILE=sampling python main_pipeline.py
+    python preprocessing_historical.py --profile=cprofile
+    python main_pipeline.py --profile                  # sampling
+
+Modes:
+- sampling - a background thread samples the stacks of ALL threads every
+  PROFILE_SAMPLE_INTERVAL seconds (low overhead, sees the worker pool)
+  → <name>_profile_<timestamp>.collapsed (flamegraph.pl / speedscope input)
+- cprofile - deterministic cProfile of the calling thread and of every thread
+  started while profiling (worker pool), merged into one report
+  → <name>_profile_<timestamp>.prof (pstats) and _cprofile.txt (top functions)
+
+Both modes write <name>_profile_<timestamp>_allocations.txt: traced memory and
+the top allocation sites (and their growth) at every stage marked with
+mark_stage(), e.g. after load, after unit conversion, after NPK correction
+and after each location. mark_stage() is a no-op when profiling is off.
+
+tracemalloc slows allocation-heavy code (CSV writing, DataFrame building)
+several times over; set HISTORICAL_PROFILE_MEMORY=0 for a CPU-only profile
+with realistic timings.
+================================================================================
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV_VAR = "HISTORICAL_PROFILE"          # 'sampling' | 'cprofile' (unset/'0' = off)
+PROFILE_DIR_ENV_VAR = "HISTORICAL_PROFILE_DIR"  # Overrides the output directory
+PROFILE_MEMORY_ENV_VAR = "HISTORICAL_PROFILE_MEMORY"  # '0' = no tracemalloc snapshots
+PROFILE_FLAG = "--profile"
+MODES = ('sampling', 'cprofile')
+DEFAULT_MODE = 'sampling'
+
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_TOP_FUNCTIONS = 50       # Rows in the cProfile text report
+PROFILE_TOP_ALLOCATIONS = 25     # Allocation sites listed per stage
+TRACEMALLOC_FRAMES = 1           # Frames kept per traced allocation (reports group by line)
+
+# Python 3.12+ runs cProfile on sys.monitoring, which allows one active
+# profiler per process - a Profile per thread is only possible before that
+PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+
+_active = None
+
+
+# ==================== CONFIGURATION ====================
+
+def profile_mode(argv: Optional[List[str]] = None) -> Optional[str]:
+    """Profiling mode requested by --profile[=mode] or HISTORICAL_PROFILE, None if off"""
+    argv = sys.argv[1:] if argv is None else argv
+    
+    requested = None
+    for arg in argv:
+        if arg == PROFILE_FLAG:
+            requested = DEFAULT_MODE
+        elif arg.startswith(PROFILE_FLAG + "="):
+            requested = arg.split("=", 1)[1]
+    
+    if requested is None:
+        requested = os.environ.get(PROFILE_ENV_VAR, "").strip().lower()
+        if requested in ("", "0", "false", "off", "no"):
+            return None
+        if requested in ("1", "true", "on", "yes"):
+            requested = DEFAULT_MODE
+    
+    if requested not in MODES:
+        raise ValueError(f"Unknown profiling mode: {requested} (expected one of {', '.join(MODES)})")
+    return requested
+
+
+def profile_memory() -> bool:
+    """Whether tracemalloc snapshots are taken (HISTORICAL_PROFILE_MEMORY, default on)"""
+    return os.environ.get(PROFILE_MEMORY_ENV_VAR, "1").strip().lower() not in ("0", "false", "off", "no")
+
+
+# ==================== SAMPLING PROFILER ====================
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler for all threads of the process
+    
+    Every interval the current stack of each thread is folded into a
+    'thread;outer;...;inner' key; counts are written in collapsed-stack format.
+    """
+    
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    
+    def _sample(self):
+        own_ident = threading.get_ident()
+        # Pool workers are named worker_0, worker_1, ... - fold them into one root
+        names = {t.ident: re.sub(r'_\d+$', '', t.name) for t in threading.enumerate()}
+        
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(self._frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[";".join(reversed(labels))] += 1
+        self.samples += 1
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def write_collapsed(self, output_file: Path):
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# ==================== RUN PROFILER ====================
+
+class RunProfiler:
+    """CPU profile of one entry point run plus tracemalloc snapshots at stage boundaries"""
+    
+    def __init__(
+        self,
+        name: str,
+        mode: str = DEFAULT_MODE,
+        output_dir: Path = Path("logs"),
+        memory: bool = True
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.name = name
+        self.mode = mode
+        self.memory = memory
+        self.output_dir = Path(os.environ.get(PROFILE_DIR_ENV_VAR) or output_dir)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.prefix = self.output_dir / f"{name}_profile_{timestamp}"
+        
+        self.stages = []
+        self._previous_snapshot = None
+        self._lock = threading.Lock()
+        self._cprofile = None
+        self._thread_profiles = []
+        self._sampler = None
+        self._started_tracemalloc = False
+    
+    def start(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self.mark_stage("start")
+        
+        if self.mode == 'cprofile':
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+            if PER_THREAD_CPROFILE:
+                threading.setprofile(self._profile_new_thread)
+            else:
+                logger.warning("⚠️  cProfile only sees the calling thread on this Python - use --profile=sampling for the worker threads")
+        else:
+            self._sampler = StackSampler()
+            self._sampler.start()
+        
+        logger.info(f"🧪 Profiling {self.name} ({self.mode}) → {self.prefix}*")
+    
+    def _profile_new_thread(self, frame, event, arg):
+        """threading.setprofile hook: give each new thread its own Profile (merged in stop)"""
+        profile = cProfile.Profile()
+        with self._lock:
+            self._thread_profiles.append(profile)
+        profile.enable()
+    
+    def mark_stage(self, label: str):
+        """Record traced memory and the top allocation sites at a stage boundary"""
+        if not self.memory or not tracemalloc.is_tracing():
+            return
+        
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            ))
+            current, peak = tracemalloc.get_traced_memory()
+            
+            top = snapshot.statistics('lineno')[:PROFILE_TOP_ALLOCATIONS]
+            growth = []
+            if self._previous_snapshot is not None:
+                growth = [
+                    stat for stat in snapshot.compare_to(self._previous_snapshot, 'lineno')
+                    if stat.size_diff > 0
+                ][:PROFILE_TOP_ALLOCATIONS]
+            self._previous_snapshot = snapshot
+            
+            self.stages.append({
+                'label': label,
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'current': current,
+                'peak': peak,
+                'top': top,
+                'growth': growth,
+            })
+    
+    def stop(self):
+        """Stop profiling and write the reports"""
+        if self._cprofile is not None:
+            threading.setprofile(None)
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.mark_stage("end")
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        
+        written = []
+        if self._cprofile is not None:
+            written += self._write_cprofile()
+        if self._sampler is not None:
+            collapsed_file = self.prefix.with_suffix(".collapsed")
+            self._sampler.write_collapsed(collapsed_file)
+            written.append(collapsed_file)
+        if self.memory:
+            written.append(self._write_allocations())
+        
+        for path in written:
+            logger.info(f"🧪 Profile written: {path}")
+        return written
+    
+    def _write_cprofile(self) -> List[Path]:
+        prof_file = self.prefix.with_suffix(".prof")
+        stream = io.StringIO()
+        stats = pstats.Stats(self._cprofile, *self._thread_profiles, stream=stream)
+        stats.dump_stats(prof_file)
+        
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        text_file = Path(f"{self.prefix}_cprofile.txt")
+        text_file.write_text(stream.getvalue(), encoding='utf-8')
+        return [prof_file, text_file]
+    
+    def _write_allocations(self) -> Path:
+        output_file = Path(f"{self.prefix}_allocations.txt")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(f"TOP ALLOCATIONS - {self.name}\n")
+            f.write("=" * 80 + "\n")
+            for stage in self.stages:
+                f.write(
+                    f"\n[{stage['time']}] {stage['label']}: "
+                    f"traced {stage['current'] / 1024 ** 2:.1f} MB, peak {stage['peak'] / 1024 ** 2:.1f} MB\n"
+                )
+                f.write("-" * 80 + "\n")
+                for stat in stage['top']:
+                    f.write(f"  {stat}\n")
+                if stage['growth']:
+                    f.write("  Growth since previous stage:\n")
+                    for stat in stage['growth']:
+                        f.write(f"    {stat}\n")
+        return output_file
+
+
+# ==================== ENTRY POINT HOOKS ====================
+
+@contextmanager
+def profile_run(name: str, output_dir: Path = Path("logs"), argv: Optional[List[str]] = None):
+    """
+    Profile the enclosed block if profiling was requested, else do nothing
+    
+    Yields the RunProfiler, or None when profiling is off.
+    """
+    global _active
+    
+    mode = profile_mode(argv)
+    if mode is None:
+        yield None
+        return
+    
+    profiler = RunProfiler(name, mode, output_dir, profile_memory())
+    profiler.start()
+    _active = profiler
+    try:
+        yield profiler
+    finally:
+        _active = None
+        profiler.stop()
+
+
+def mark_stage(label: str):
+    """Take a memory snapshot at a stage boundary of the profiled run (no-op when off)"""
+    profiler = _active
+    if profiler is not None:
+        profiler.mark_stage(label)